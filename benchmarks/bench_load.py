@@ -0,0 +1,94 @@
+"""Compare CSV parsing against the columnar store.
+
+Every measurement runs in a fresh interpreter so peak RSS is not polluted by
+earlier runs. "cold" is the first read in that process, "warm" the second.
+
+    python benchmarks/bench_load.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+PROJECTIONS = {
+    "aqi_combined_1980_2024.csv": ["Year", "AQI_Median"],
+    "reshaped_snow_depth.csv": ["Site", "Water Year", "Snow Depth (in)"],
+    "fixed_ground_water_cleaned.csv": ["Water Year", "Static Water Level (ft)"],
+}
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _measure(method, name):
+    import pandas as pd
+
+    from dashboard import data, store
+
+    readers = {
+        "read_csv": lambda: pd.read_csv(data.dataset_path(name)),
+        "store": lambda: store.read(name),
+        "store_projected": lambda: store.read(name, columns=PROJECTIONS[name]),
+    }
+    read = readers[method]
+    base_rss = _rss_mb()
+    start = time.perf_counter()
+    read()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    read()
+    warm = time.perf_counter() - start
+    return {
+        "dataset": name,
+        "method": method,
+        "cold_ms": cold * 1000,
+        "warm_ms": warm * 1000,
+        "peak_rss_delta_mb": _rss_mb() - base_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_measure(*args.child)))
+        return
+
+    from dashboard import data
+
+    for name in PROJECTIONS:
+        data.convert(name)
+
+    results = []
+    for name in PROJECTIONS:
+        for method in ("read_csv", "store", "store_projected"):
+            runs = [
+                json.loads(subprocess.check_output([sys.executable, __file__, "--child", method, name]))
+                for _ in range(args.repeat)
+            ]
+            best = min(runs, key=lambda run: run["cold_ms"])
+            results.append(best)
+            print(
+                f"{name:34} {method:16} cold {best['cold_ms']:8.2f} ms  "
+                f"warm {best['warm_ms']:8.2f} ms  peak RSS +{best['peak_rss_delta_mb']:6.1f} MB"
+            )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
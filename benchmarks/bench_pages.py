@@ -0,0 +1,277 @@
+"""Headless page benchmark on synthetic datasets of growing size.
+
+For each scale, synthetic copies of the three files in ``data/`` are written
+to ``benchmarks/.data/x<scale>/`` (reused on later runs): every original row
+is repeated ``scale`` times under new site / CBSA / system names with jittered
+measurements, so the shape, years and column types match the real files.
+
+Each page then runs in a fresh interpreter pointed at that directory through
+``DASHBOARD_DATA_DIR`` and is driven with Streamlit's ``AppTest`` through a
+scripted sequence of filter changes. Per step it records the rerun time, the
+time spent in each section (from one ``st.subheader`` to the next), the bytes
+rendered (element messages plus images) and, per page, the peak RSS. The
+last step opens every lazy section. Each page runs once per chart backend in
+``--backends`` (both by default, so a chart that only fails as a Vega-Lite
+spec fails the run). With ``--users N`` the same script is also replayed by N
+concurrent sessions.
+
+    python benchmarks/bench_pages.py --scales 1,100 --users 4 --json results.json
+    python benchmarks/bench_pages.py --scales 1 --backends vega
+    python benchmarks/bench_pages.py --scales 10000          # ~55M snow rows
+
+Use ``--compare old.json`` to print the change against an earlier run.
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from dashboard import data  # noqa: E402
+
+SYNTHETIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+WRITE_ROWS = 500_000
+
+# Columns renamed per copy (so every copy is a new site) and columns jittered.
+SYNTHETIC = {
+    data.AQI: {"keys": ["CBSA"], "codes": ["CBSA_Code"], "noise": ["AQI_Maximum", "AQI_90th_Percentile", "AQI_Median"]},
+    data.SNOW_DEPTH: {"keys": ["Site", "Station"], "codes": [], "noise": ["Snow Depth (in)"]},
+    data.GROUND_WATER: {"keys": ["System Name"], "codes": [], "noise": ["Depth of Well (ft)", "Static Water Level (ft)"]},
+}
+
+
+CHART_BACKENDS = ["matplotlib", "vega"]
+
+
+def _open_sections(at):
+    for key in at.session_state.keys():
+        if key.endswith(".expanded"):
+            at.session_state[key] = True
+
+
+# Scripted sessions: (step name, widget change before the run, if any).
+SCENARIOS = {
+    "app21.py": [("load", None), ("rerun", None)],
+    "pages/page1.py": [
+        ("load", None),
+        ("years", lambda at: at.sidebar.slider[0].set_value((2000, 2010))),
+        ("cbsa", lambda at: at.sidebar.selectbox[0].select_index(1)),
+        ("rerun", None),
+        ("open", _open_sections),
+    ],
+    "pages/page2.py": [
+        ("load", None),
+        ("years", lambda at: at.sidebar.slider[0].set_value((2000, 2015))),
+        ("site", lambda at: at.sidebar.selectbox[0].select_index(1)),
+        ("rerun", None),
+        ("open", _open_sections),
+    ],
+    "pages/page3.py": [("load", None), ("rerun", None), ("open", _open_sections)],
+}
+
+
+def synthesize(scale, seed=0):
+    """Write the synthetic datasets for ``scale`` and return their directory."""
+    directory = os.path.join(SYNTHETIC_DIR, f"x{scale}")
+    marker = os.path.join(directory, ".complete")
+    if os.path.exists(marker):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for name, layout in SYNTHETIC.items():
+        original = pd.read_csv(data.dataset_path(name))
+        copies_per_write = max(1, WRITE_ROWS // len(original))
+        path = os.path.join(directory, name)
+        with open(path, "w", newline="") as handle:
+            for start in range(0, scale, copies_per_write):
+                copies = np.arange(start, min(scale, start + copies_per_write))
+                block = pd.concat([original] * len(copies), ignore_index=True)
+                copy = np.repeat(copies, len(original))
+                suffix = np.where(copy == 0, "", " #" + copy.astype(str))
+                for col in layout["keys"]:
+                    block[col] = block[col].astype(str) + suffix
+                for col in layout["codes"]:
+                    block[col] = block[col] + copy * 1_000_000
+                for col in layout["noise"]:
+                    jitter = rng.uniform(0.8, 1.2, len(block))
+                    block[col] = np.where(copy == 0, block[col], (block[col] * jitter).round(1))
+                block.to_csv(handle, header=start == 0, index=False)
+    open(marker, "w").close()
+    return directory
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _element_bytes(at):
+    def walk(node):
+        children = getattr(node, "children", None)
+        if children is None:
+            yield node
+            return
+        for child in children.values():
+            yield from walk(child)
+
+    return sum(node.proto.ByteSize() for node in walk(at._tree) if getattr(node, "proto", None) is not None)
+
+
+def _run_scenario(page, marks=None, media=None):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=600)
+    steps = []
+    for step, action in SCENARIOS[page]:
+        if action is not None:
+            action(at)
+        if marks is not None:
+            marks.clear()
+            media.clear()
+        start = time.perf_counter()
+        at.run()
+        end = time.perf_counter()
+        if at.exception:
+            raise RuntimeError(f"{page} {step}: {at.exception[0].value}")
+        result = {"step": step, "rerun_ms": (end - start) * 1000}
+        if marks is not None:
+            bounds = [("setup", start)] + marks + [(None, end)]
+            result["sections_ms"] = {
+                title: (bounds[i + 1][1] - at_time) * 1000 for i, (title, at_time) in enumerate(bounds[:-1])
+            }
+            result["rendered_bytes"] = _element_bytes(at) + sum(media)
+        steps.append(result)
+    return steps
+
+
+def _measure(page, users):
+    import streamlit as st
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    # Section boundaries: every page opens a section with st.subheader.
+    marks = []
+    subheader = st.subheader
+
+    def timed_subheader(body, *args, **kwargs):
+        marks.append((str(body), time.perf_counter()))
+        return subheader(body, *args, **kwargs)
+
+    # Images are sent as media files, outside the element messages.
+    media = []
+    load_and_get_id = MemoryMediaFileStorage.load_and_get_id
+
+    def counted_load_and_get_id(self, path_or_data, *args, **kwargs):
+        if isinstance(path_or_data, bytes):
+            media.append(len(path_or_data))
+        return load_and_get_id(self, path_or_data, *args, **kwargs)
+
+    st.subheader = timed_subheader
+    MemoryMediaFileStorage.load_and_get_id = counted_load_and_get_id
+    steps = _run_scenario(page, marks, media)
+    st.subheader = subheader
+    MemoryMediaFileStorage.load_and_get_id = load_and_get_id
+
+    result = {"page": page, "steps": steps}
+    if users > 1:
+        latencies = []
+        errors = []
+
+        def session():
+            try:
+                latencies.extend(step["rerun_ms"] for step in _run_scenario(page))
+            except Exception as error:  # reported, not fatal to the other sessions
+                errors.append(str(error))
+
+        threads = [threading.Thread(target=session) for _ in range(users)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result["concurrent"] = {
+            "users": users,
+            "wall_ms": (time.perf_counter() - start) * 1000,
+            "p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+            "p95_ms": float(np.percentile(latencies, 95)) if latencies else None,
+            "max_ms": max(latencies) if latencies else None,
+            "errors": errors,
+        }
+    result["peak_rss_mb"] = _rss_mb()
+    return result
+
+
+def compare(old, new):
+    """Print the rerun time change of every (scale, page, step) present in both runs."""
+    def index(results):
+        return {
+            (run["scale"], run.get("backend", "matplotlib"), run["page"], step["step"]): step["rerun_ms"]
+            for run in results["runs"] for step in run["steps"]
+        }
+    before, after = index(old), index(new)
+    for key in sorted(before.keys() & after.keys()):
+        change = (after[key] - before[key]) / before[key] * 100 if before[key] else float("nan")
+        print(f"x{key[0]:<6} {key[1]:10} {key[2]:16} {key[3]:6} {before[key]:9.1f} -> {after[key]:9.1f} ms ({change:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1,100", help="comma-separated row multipliers (default %(default)s)")
+    parser.add_argument("--pages", default=",".join(SCENARIOS), help="comma-separated pages (default: all)")
+    parser.add_argument("--backends", default=",".join(CHART_BACKENDS), help="comma-separated chart backends (default: all)")
+    parser.add_argument("--users", type=int, default=1, help="concurrent sessions to replay each page with")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_measure(args.child[0], int(args.child[1]))))
+        return
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0], "runs": []}
+    for scale in [int(value) for value in args.scales.split(",")]:
+        start = time.perf_counter()
+        directory = synthesize(scale)
+        print(f"x{scale}: synthetic data ready in {time.perf_counter() - start:.1f} s ({directory})")
+        for backend, page in itertools.product(args.backends.split(","), args.pages.split(",")):
+            env = dict(
+                os.environ, DASHBOARD_DATA_DIR=directory, DASHBOARD_STORE_DIR=os.path.join(directory, ".store"),
+                DASHBOARD_CHART_BACKEND=backend,
+            )
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--child", page, str(args.users)], env=env, cwd=ROOT, stderr=subprocess.DEVNULL
+            )
+            run = dict(json.loads(output.splitlines()[-1]), scale=scale, backend=backend)
+            results["runs"].append(run)
+            label = f"x{scale:<6} {backend:10} {page:16}"
+            for step in run["steps"]:
+                print(
+                    f"{label} {step['step']:6} rerun {step['rerun_ms']:9.1f} ms  "
+                    f"rendered {step['rendered_bytes'] / 1024:8.1f} KiB"
+                )
+            if "concurrent" in run:
+                c = run["concurrent"]
+                print(f"{label} {c['users']} users: p50 {c['p50_ms']:.1f} ms  p95 {c['p95_ms']:.1f} ms")
+            print(f"{label} peak RSS {run['peak_rss_mb']:.1f} MB")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(json.load(handle), results)
+
+
+if __name__ == "__main__":
+    main()
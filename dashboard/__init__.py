@@ -0,0 +1 @@
+"""Shared data and analysis helpers for the Group-021 environmental dashboards."""
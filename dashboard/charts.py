@@ -0,0 +1,147 @@
+"""Chart rendering backends.
+
+``DASHBOARD_CHART_BACKEND`` selects how the dashboards draw charts for a
+deployment:
+
+* ``matplotlib`` (default) rasterises every chart on the server through the
+  image cache in ``dashboard.figures``.
+* ``vega`` ships the already aggregated series to the browser as a Vega-Lite
+  spec. Zooming, panning and hovering happen client-side without a rerun.
+
+Each chart passes both a matplotlib ``draw`` function and, where available, a
+``spec`` callable built from the helpers below. Charts without a spec always
+use matplotlib.
+"""
+import os
+
+import streamlit as st
+
+from dashboard import figures
+
+BACKEND = os.environ.get("DASHBOARD_CHART_BACKEND", "matplotlib").lower()
+
+# Drag to pan and scroll to zoom on continuous axes.
+ZOOM = {"name": "zoom", "select": "interval", "bind": "scales"}
+
+# Column holding the values of long-format frames; axis titles are set separately.
+VALUE = "value"
+
+
+def _field(name):
+    # Vega-Lite treats "." and "[" in field names as nested access.
+    return name.replace(".", "\\.").replace("[", "\\[").replace("]", "\\]")
+
+
+def _year_axis(field, title):
+    return {"field": _field(field), "type": "quantitative", "title": title, "axis": {"format": "d"}, "scale": {"zero": False}}
+
+
+def line(frame, title, x_title, y_title, legend_title="Series", trend=False, temporal=False):
+    """Lines over the index of ``frame``, one per column; ``temporal`` for a date index."""
+    if not hasattr(frame, "columns"):
+        frame = frame.to_frame()
+    x = frame.index.name
+    values = frame.reset_index().melt(id_vars=x, var_name=legend_title, value_name=VALUE)
+    encoding = {
+        "x": {"field": _field(x), "type": "temporal", "title": x_title} if temporal else _year_axis(x, x_title),
+        "y": {"field": VALUE, "type": "quantitative", "title": y_title, "scale": {"zero": False}},
+        "color": {"field": _field(legend_title), "type": "nominal", "legend": None if frame.shape[1] == 1 else {}},
+    }
+    layers = [{"mark": {"type": "line", "point": True, "tooltip": True}, "encoding": encoding, "params": [ZOOM]}]
+    if trend:
+        layers.append({
+            "mark": {"type": "line", "strokeDash": [6, 4]},
+            "transform": [{"regression": VALUE, "on": _field(x), "groupby": [_field(legend_title)]}],
+            "encoding": encoding,
+        })
+    return values, {"title": title, "layer": layers}
+
+
+def scatter(frame, x, y, title, x_title, y_title, color="steelblue", year_axis=False):
+    """Points of ``y`` against ``x`` with a least-squares trend line."""
+    values = (frame.reset_index() if frame.index.name else frame)[[x, y]]
+    x_encoding = _year_axis(x, x_title) if year_axis else {
+        "field": _field(x), "type": "quantitative", "title": x_title, "scale": {"zero": False},
+    }
+    encoding = {
+        "x": x_encoding,
+        "y": {"field": _field(y), "type": "quantitative", "title": y_title, "scale": {"zero": False}},
+    }
+    return values, {
+        "title": title,
+        "layer": [
+            {
+                "mark": {"type": "circle", "size": 60, "color": color, "opacity": 0.7, "stroke": "black", "tooltip": True},
+                "encoding": encoding,
+                "params": [ZOOM],
+            },
+            {
+                "mark": {"type": "line", "color": "red"},
+                "transform": [{"regression": _field(y), "on": _field(x)}],
+                "encoding": encoding,
+            },
+        ],
+    }
+
+
+def bar(series, title, x_title, y_title, color="skyblue", horizontal=False):
+    """One bar per index label of ``series``."""
+    label, value = series.index.name or x_title, series.name or y_title
+    values = series.rename(value).rename_axis(label).reset_index()
+    category = {"field": _field(label), "type": "nominal", "title": x_title, "sort": None}
+    amount = {"field": _field(value), "type": "quantitative", "title": y_title}
+    if horizontal:
+        category["title"], amount["title"] = y_title, x_title
+    encoding = {"y": category, "x": amount} if horizontal else {"x": category, "y": amount}
+    return values, {"title": title, "mark": {"type": "bar", "color": color, "tooltip": True}, "encoding": encoding}
+
+
+def stacked_bar(frame, title, x_title, y_title, legend_title="Series"):
+    """Bars over the index of ``frame`` with one stacked segment per column."""
+    x = frame.index.name
+    values = frame.reset_index().melt(id_vars=x, var_name=legend_title, value_name=VALUE)
+    return values, {
+        "title": title,
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "x": {"field": _field(x), "type": "ordinal", "title": x_title},
+            "y": {"field": VALUE, "type": "quantitative", "title": y_title, "stack": "zero"},
+            "color": {"field": _field(legend_title), "type": "nominal"},
+        },
+    }
+
+
+def heatmap(matrix, title, legend_title):
+    """Annotated heatmap of a square matrix such as ``DataFrame.corr()``."""
+    values = matrix.rename_axis("Row").reset_index().melt(id_vars="Row", var_name="Column", value_name="Value")
+    encoding = {
+        "x": {"field": "Column", "type": "nominal", "sort": None, "title": None},
+        "y": {"field": "Row", "type": "nominal", "sort": None, "title": None},
+    }
+    return values, {
+        "title": title,
+        "encoding": encoding,
+        "layer": [
+            {
+                "mark": {"type": "rect", "tooltip": True},
+                "encoding": {"color": {
+                    "field": "Value", "type": "quantitative", "title": legend_title,
+                    "scale": {"scheme": "blueorange", "domainMid": 0},
+                }},
+            },
+            {"mark": "text", "encoding": {"text": {"field": "Value", "type": "quantitative", "format": ".2f"}}},
+        ],
+    }
+
+
+def show(chart_id, draw, spec=None, params=None, datasets=(), figsize=(10, 6)):
+    """Display a chart with the configured backend.
+
+    ``spec`` is a callable returning ``(data, vega_lite_spec)``; it is only
+    called when the ``vega`` backend is active.
+    """
+    if BACKEND == "vega" and spec is not None:
+        values, vega_spec = spec()
+        st.vega_lite_chart(values, vega_spec, width="stretch")
+    else:
+        figures.show(chart_id, draw, params=params, datasets=datasets, figsize=figsize)
@@ -0,0 +1,179 @@
+"""Correlations between many yearly series at once.
+
+Series are rows of a matrix on a shared year axis (``NaN`` where a key has no
+data), typically the per-key yearly means of an aggregate cube. ``pearson``
+and ``spearman`` correlate every row of one matrix with every row of another
+through a few matrix products over pairwise-complete years, ``paired``
+correlates only matching rows (station pairs), ``lagged`` does the same as
+``pearson`` with the second matrix shifted by 0..k years, and ``bootstrap``
+resamples years in one vectorized pass (optionally split over a process pool)
+to put confidence intervals on the correlations of a small set of series.
+
+Results that the dashboards display are cached per dataset version through
+``cached``.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dashboard import cube as cubes
+from dashboard import data, metrics, precompute
+
+MIN_YEARS = 5
+BOOTSTRAP_PROCESSES = int(os.environ.get("DASHBOARD_BOOTSTRAP_PROCESSES", "0"))
+
+
+def yearly_matrix(name, measure, years, keys=True):
+    """Return the yearly means of ``measure`` per key of dataset ``name`` on ``years``.
+
+    Rows follow the cube's keys; with ``keys=False`` the single row is the
+    mean over all keys.
+    """
+    cube = cubes.get(name)
+    m = cube.measures.index(measure)
+    with np.errstate(all="ignore"):
+        means = cube.sum[m] / cube.count[m]
+    means = means[:-1] if keys else means[-1:]
+    out = np.full((len(means), len(years)), np.nan)
+    inside = (years >= cube.years[0]) & (years <= cube.years[-1])
+    out[:, inside] = means[:, years[inside] - cube.years[0]]
+    return pd.DataFrame(out, index=cube.keys if keys else [measure], columns=years)
+
+
+def pearson(a, b, min_years=MIN_YEARS):
+    """Pearson correlation of every row of ``a`` with every row of ``b``.
+
+    Both are 2-D arrays on the same year axis. Each pair uses the years where
+    both rows have data; pairs with fewer than ``min_years`` such years are
+    ``NaN``. Returns ``(r, n)`` with shapes (rows of a, rows of b).
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    mask_a, mask_b = ~np.isnan(a), ~np.isnan(b)
+    a0, b0 = np.where(mask_a, a, 0.0), np.where(mask_b, b, 0.0)
+    ma, mb = mask_a.astype(float), mask_b.astype(float)
+    n = ma @ mb.T
+    sa, sb = a0 @ mb.T, ma @ b0.T
+    saa, sbb, sab = (a0 * a0) @ mb.T, ma @ (b0 * b0).T, a0 @ b0.T
+    with np.errstate(all="ignore"):
+        cov = n * sab - sa * sb
+        r = cov / np.sqrt((n * saa - sa * sa) * (n * sbb - sb * sb))
+    r[n < min_years] = np.nan
+    return np.clip(r, -1, 1), n.astype(int)
+
+
+def paired(a, b, min_years=MIN_YEARS):
+    """Pearson correlation of each row of ``a`` with the same row of ``b``.
+
+    Like the diagonal of ``pearson(a, b)`` without computing every other
+    pair. Returns ``(r, n)``, one entry per row.
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    both = ~np.isnan(a) & ~np.isnan(b)
+    a0, b0 = np.where(both, a, 0.0), np.where(both, b, 0.0)
+    n = both.sum(axis=1)
+    sa, sb = a0.sum(axis=1), b0.sum(axis=1)
+    with np.errstate(all="ignore"):
+        cov = n * (a0 * b0).sum(axis=1) - sa * sb
+        r = cov / np.sqrt((n * (a0 * a0).sum(axis=1) - sa * sa) * (n * (b0 * b0).sum(axis=1) - sb * sb))
+    r[n < min_years] = np.nan
+    return np.clip(r, -1, 1), n
+
+
+def _ranks(matrix):
+    # Average ranks within each row, ignoring NaN.
+    frame = pd.DataFrame(matrix)
+    return frame.rank(axis=1).to_numpy()
+
+
+def spearman(a, b, min_years=MIN_YEARS):
+    """Spearman correlation of every row of ``a`` with every row of ``b``.
+
+    Rows are ranked over their own years with data, so the result is exact
+    for pairs that cover the same years and an approximation otherwise.
+    """
+    return pearson(_ranks(a), _ranks(b), min_years)
+
+
+def lagged(a, b, lags, method="pearson", min_years=MIN_YEARS):
+    """Correlate ``a`` in year N with ``b`` in year N + lag for each lag.
+
+    Returns ``(r, n)`` with shapes (len(lags), rows of a, rows of b).
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    correlate = spearman if method == "spearman" else pearson
+    results = [correlate(a[:, :a.shape[1] - lag], b[:, lag:], min_years) for lag in lags]
+    return np.stack([r for r, _ in results]), np.stack([n for _, n in results])
+
+
+def _bootstrap_draws(values, n_boot, seed, method):
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(values), size=(n_boot, len(values)))
+    samples = values[index]  # (draws, years, variables)
+    if method == "spearman":
+        samples = samples.argsort(axis=1).argsort(axis=1).astype(float)
+    centered = samples - samples.mean(axis=1, keepdims=True)
+    cov = np.einsum("byi,byj->bij", centered, centered)
+    scale = np.sqrt(np.einsum("bii->bi", cov))
+    with np.errstate(all="ignore"):
+        return cov / scale[:, :, None] / scale[:, None, :]
+
+
+def bootstrap(frame, n_boot=2000, ci=0.95, method="pearson", seed=0, processes=BOOTSTRAP_PROCESSES):
+    """Bootstrap confidence intervals for the correlations between columns.
+
+    Rows (years) of ``frame`` are resampled with replacement; rows with any
+    missing value are dropped first. Spearman resamples use ordinal ranks.
+    With ``processes`` > 1 the draws are split over a process pool. Returns a
+    frame with one row per column pair: ``r``, ``low``, ``high`` and ``n``.
+    """
+    frame = frame.dropna()
+    values = frame.to_numpy(dtype=float)
+    seeds = np.random.SeedSequence(seed).spawn(max(1, processes))
+    sizes = [len(part) for part in np.array_split(np.arange(n_boot), len(seeds))]
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            draws = list(pool.map(_bootstrap_draws, [values] * len(seeds), sizes, seeds, [method] * len(seeds)))
+    else:
+        draws = [_bootstrap_draws(values, size, s, method) for size, s in zip(sizes, seeds)]
+    draws = np.concatenate(draws)
+    point = (frame.rank() if method == "spearman" else frame).corr().to_numpy()
+    low, high = np.nanquantile(draws, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+    i, j = np.triu_indices(len(frame.columns), k=1)
+    return pd.DataFrame({
+        "Variable 1": frame.columns[i],
+        "Variable 2": frame.columns[j],
+        "r": point[i, j],
+        "low": low[i, j],
+        "high": high[i, j],
+        "n": len(frame),
+    })
+
+
+_lock = threading.Lock()
+_cache = {}  # (key, dataset versions) -> result
+
+
+def cached(key, datasets, compute):
+    """Return ``compute()``, cached under ``key`` for the current versions of ``datasets``."""
+    full_key = (key, tuple(data.dataset_version(name) for name in datasets))
+    with _lock:
+        metrics.count("correlation", full_key in _cache)
+        if full_key in _cache:
+            return _cache[full_key]
+
+    def build():
+        with metrics.section("correlation"):
+            return compute()
+
+    result, fresh = precompute.lookup(("correlation", key), full_key[1], build)
+    if not fresh:
+        return result
+    with _lock:
+        # Keep only results for the current dataset versions.
+        for stale in [k for k in _cache if k[0] == key]:
+            del _cache[stale]
+        _cache[full_key] = result
+    return result
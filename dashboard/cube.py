@@ -0,0 +1,245 @@
+"""Materialised per-(year, key) aggregates for the dashboard datasets.
+
+A ``Cube`` holds sum, count, min, max and a few quantiles of every measure for
+each (key, year) cell, e.g. (CBSA, Year) for air quality or (Site, Water Year)
+for snow depth, plus an extra "all keys" row. Sums and counts are also stored
+as prefix sums along the year axis, so totals and means over any year range
+are two lookups instead of a filter and a groupby over the raw rows.
+
+Pre-aggregated inputs (see ``dashboard.ingest``) carry a weight column with
+the number of raw rows behind each value; sums and counts then reflect the
+raw rows, while min, max and quantiles are taken over the aggregated values.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data, metrics, precompute
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+class Cube:
+    def __init__(self, frame, year_col, key_col, measures, quantiles=QUANTILES, weight_col=None):
+        self.year_col = year_col
+        self.key_col = key_col
+        self.measures = list(measures)
+        self.quantiles = tuple(quantiles)
+        self.weight_col = weight_col
+
+        keys = frame[key_col]
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            self.keys = pd.Index(keys.cat.categories)
+            key_idx = keys.cat.codes.to_numpy().astype(np.int64)
+        else:
+            self.keys = pd.Index(np.sort(keys.unique()))
+            key_idx = self.keys.get_indexer(keys).astype(np.int64)
+        year_values = frame[year_col].to_numpy()
+        self.years = np.arange(year_values.min(), year_values.max() + 1)
+        year_idx = year_values - self.years[0]
+
+        n_keys, n_years, n_measures = len(self.keys), len(self.years), len(self.measures)
+        cell = key_idx * n_years + year_idx
+        size = n_keys * n_years
+        shape = (n_measures, n_keys + 1, n_years)
+
+        # The last row along the key axis aggregates every key.
+        self.rows = np.zeros((n_keys + 1, n_years), dtype=np.int64)
+        self.rows[:-1] = np.bincount(cell, minlength=size).reshape(n_keys, n_years)
+        self.rows[-1] = self.rows[:-1].sum(axis=0)
+
+        self.sum = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64 if weight_col is None else float)
+        weights = None if weight_col is None else frame[weight_col].to_numpy(dtype=float)
+        self.min = np.full(shape, np.nan)
+        self.max = np.full(shape, np.nan)
+        for m, measure in enumerate(self.measures):
+            values = frame[measure].to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(values)
+            cells, values = cell[valid], values[valid]
+            cell_weights = None if weights is None else weights[valid]
+            weighted = values if weights is None else values * cell_weights
+            self.sum[m, :-1] = np.bincount(cells, weighted, minlength=size).reshape(n_keys, n_years)
+            self.count[m, :-1] = np.bincount(cells, cell_weights, minlength=size).reshape(n_keys, n_years)
+            lo = np.full(size, np.inf)
+            hi = np.full(size, -np.inf)
+            np.minimum.at(lo, cells, values)
+            np.maximum.at(hi, cells, values)
+            self.min[m, :-1] = np.where(np.isinf(lo), np.nan, lo).reshape(n_keys, n_years)
+            self.max[m, :-1] = np.where(np.isinf(hi), np.nan, hi).reshape(n_keys, n_years)
+        self.sum[:, -1] = self.sum[:, :-1].sum(axis=1)
+        self.count[:, -1] = self.count[:, :-1].sum(axis=1)
+        with np.errstate(all="ignore"):
+            self.min[:, -1] = np.fmin.reduce(self.min[:, :-1], axis=1)
+            self.max[:, -1] = np.fmax.reduce(self.max[:, :-1], axis=1)
+
+        self.quantile = np.full((len(self.quantiles),) + shape, np.nan)
+        self._fill_quantiles(frame)
+        self._update_prefix()
+
+    def _fill_quantiles(self, frame):
+        # Quantiles cannot be combined, so they are always computed from rows.
+        if not self.quantiles or frame.empty:
+            return
+        key_idx = self.keys.get_indexer(frame[self.key_col])
+        year_idx = frame[self.year_col].to_numpy() - self.years[0]
+        frame = frame.assign(_key=key_idx, _year=year_idx)
+        per_cell = frame.groupby(["_key", "_year"])[self.measures].quantile(list(self.quantiles))
+        per_year = frame.groupby("_year")[self.measures].quantile(list(self.quantiles))
+        k, y, q = (per_cell.index.get_level_values(i).to_numpy() for i in range(3))
+        self.quantile[np.searchsorted(self.quantiles, q), :, k, y] = per_cell.to_numpy()
+        y, q = (per_year.index.get_level_values(i).to_numpy() for i in range(2))
+        self.quantile[np.searchsorted(self.quantiles, q), :, len(self.keys), y] = per_year.to_numpy()
+
+    def _update_prefix(self):
+        pad = ((0, 0), (0, 0), (1, 0))
+        self.prefix_sum = np.pad(np.cumsum(self.sum, axis=2), pad)
+        self.prefix_count = np.pad(np.cumsum(self.count, axis=2), pad)
+
+    def extend(self, rows, frame):
+        """Return a new cube with ``rows`` folded in.
+
+        Sums, counts, min and max are combined cell by cell. Quantiles are
+        recomputed from ``frame`` (the full dataset after the append) for the
+        years ``rows`` touch only; all other years are copied over. Keys stay
+        sorted, so the result matches a cube built from ``frame``.
+        """
+        added = Cube(rows, self.year_col, self.key_col, self.measures, quantiles=(), weight_col=self.weight_col)
+        cube = Cube.__new__(Cube)
+        cube.__dict__.update(year_col=self.year_col, key_col=self.key_col, measures=self.measures,
+                             quantiles=self.quantiles, weight_col=self.weight_col)
+        cube.keys = self.keys.union(added.keys)
+        cube.years = np.arange(min(self.years[0], added.years[0]), max(self.years[-1], added.years[-1]) + 1)
+
+        def place(source, values, fill):
+            out = np.full(values.shape[:-2] + (len(cube.keys) + 1, len(cube.years)), fill, dtype=values.dtype)
+            k = np.append(cube.keys.get_indexer(source.keys), len(cube.keys))
+            out[..., k[:, None], source.years - cube.years[0]] = values
+            return out
+
+        cube.rows = place(self, self.rows, 0) + place(added, added.rows, 0)
+        cube.sum = place(self, self.sum, 0) + place(added, added.sum, 0)
+        cube.count = place(self, self.count, 0) + place(added, added.count, 0)
+        with np.errstate(all="ignore"):
+            cube.min = np.fmin(place(self, self.min, np.nan), place(added, added.min, np.nan))
+            cube.max = np.fmax(place(self, self.max, np.nan), place(added, added.max, np.nan))
+        cube.quantile = place(self, self.quantile, np.nan)
+        touched = np.unique(rows[self.year_col].to_numpy())
+        cube.quantile[..., touched - cube.years[0]] = np.nan
+        cube._fill_quantiles(frame[frame[self.year_col].isin(touched)])
+        cube._update_prefix()
+        return cube
+
+    def _key_index(self, key):
+        return len(self.keys) if key is None else self.keys.get_loc(key)
+
+    def _year_bounds(self, years):
+        if years is None:
+            return 0, len(self.years)
+        lo = int(np.clip(years[0] - self.years[0], 0, len(self.years)))
+        hi = int(np.clip(years[1] - self.years[0] + 1, 0, len(self.years)))
+        return lo, max(lo, hi)
+
+    def total(self, measure, stat="sum", key=None, years=None):
+        """Return ``stat`` ("sum", "count" or "mean") of ``measure`` over a year range."""
+        m, k = self.measures.index(measure), self._key_index(key)
+        lo, hi = self._year_bounds(years)
+        total = self.prefix_sum[m, k, hi] - self.prefix_sum[m, k, lo]
+        count = self.prefix_count[m, k, hi] - self.prefix_count[m, k, lo]
+        if stat == "sum":
+            return total
+        if stat == "count":
+            return count
+        if stat == "mean":
+            return total / count if count else np.nan
+        raise ValueError(f"Unsupported range statistic: {stat!r}")
+
+    def series(self, measure, stat="mean", key=None, years=None):
+        """Return ``stat`` of ``measure`` per year for one key (or all keys).
+
+        ``stat`` is "sum", "count", "mean", "min", "max" or one of the cube's
+        quantiles as a float. Years without any rows are left out, matching a
+        groupby over the raw rows.
+        """
+        m, k = self.measures.index(measure), self._key_index(key)
+        lo, hi = self._year_bounds(years)
+        if stat == "mean":
+            with np.errstate(all="ignore"):
+                values = self.sum[m, k, lo:hi] / self.count[m, k, lo:hi]
+        elif stat in ("sum", "count", "min", "max"):
+            values = getattr(self, stat)[m, k, lo:hi]
+        elif stat in self.quantiles:
+            values = self.quantile[self.quantiles.index(stat), m, k, lo:hi]
+        else:
+            raise ValueError(f"Unsupported statistic: {stat!r}")
+        present = self.rows[k, lo:hi] > 0
+        index = pd.Index(self.years[lo:hi][present], name=self.year_col)
+        return pd.Series(values[present], index=index, name=measure)
+
+    def frame(self, measures, stat="mean", key=None, years=None):
+        """Return ``series`` for several measures side by side."""
+        return pd.concat([self.series(m, stat, key, years) for m in measures], axis=1)
+
+
+# Cube layouts per dataset: (year column, key column, measures).
+LAYOUTS = {
+    data.AQI: (
+        "Year",
+        "CBSA",
+        [
+            "Good", "Moderate", "Unhealthy_for_Sensitive_Groups", "Unhealthy", "Very_Unhealthy", "Hazardous",
+            "#_Days_CO", "#_Days_NO2", "#_Days_O3", "#_Days_PM2.5", "#_Days_PM10",
+            "AQI_Maximum", "AQI_90th_Percentile", "AQI_Median",
+        ],
+    ),
+    data.SNOW_DEPTH: ("Water Year", "Site", ["Snow Depth (in)"]),
+    data.GROUND_WATER: ("Water Year", "System Name", ["Static Water Level (ft)", "Depth of Well (ft)"]),
+}
+
+# Raw-row count column written by the chunked ingestion pipeline.
+WEIGHT = "Measurements"
+
+_lock = threading.Lock()
+_cache = {}  # name -> (dataset version, Cube)
+
+
+def put(name, version, cube):
+    """Install an already built cube for ``version`` of dataset ``name``."""
+    with _lock:
+        _cache[name] = (version, cube)
+    precompute.save(("cube", name), (version,), cube)
+
+
+def get(name):
+    """Return the cube for dataset ``name``, rebuilding it when the data changes."""
+    version = data.dataset_version(name)
+    with _lock:
+        cached = _cache.get(name)
+        metrics.count("cube", cached is not None and cached[0] == version)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        def build():
+            year_col, key_col, measures = LAYOUTS[name]
+            weight_col = WEIGHT if WEIGHT in data.columns(name) else None
+            columns = [year_col, key_col] + measures + ([weight_col] if weight_col else [])
+            with metrics.section("cube"):
+                return Cube(data.load(name, columns), year_col, key_col, measures, weight_col=weight_col)
+
+        cube, fresh = precompute.lookup(("cube", name), (version,), build)
+        if fresh:
+            _cache[name] = (version, cube)
+        return cube
+
+
+def aqi_cube():
+    return get(data.AQI)
+
+
+def snow_cube():
+    return get(data.SNOW_DEPTH)
+
+
+def ground_water_cube():
+    return get(data.GROUND_WATER)
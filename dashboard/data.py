@@ -0,0 +1,272 @@
+"""Process-wide loaders for the CSV files in ``data/``.
+
+Each CSV is parsed once, validated and cleaned against the declared schema
+(see ``clean``) and converted into a typed columnar copy (see
+``dashboard.store``); rows that fail validation are kept aside in the store
+and returned by ``rejected``. Frames are read from that copy with
+column projection, and every Streamlit session shares the same data. With
+pandas 3 (copy-on-write), ``load`` hands each caller a lazy copy, which it
+may change without affecting the others; on older pandas the copy shares
+its data, so callers must not modify it in place. A file is re-converted
+only when its content hash or ``SCHEMA_REVISION`` changes; the hash is
+recomputed whenever the file's mtime or size moves.
+"""
+import calendar
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dashboard import metrics, store
+
+DATA_DIR = os.environ.get(
+    "DASHBOARD_DATA_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")),
+)
+
+AQI = "aqi_combined_1980_2024.csv"
+SNOW_DEPTH = "reshaped_snow_depth.csv"
+GROUND_WATER = "fixed_ground_water_cleaned.csv"
+
+# Bump when the schema below changes, so stored copies and caches are rebuilt.
+SCHEMA_REVISION = "2"
+
+MONTHS = pd.CategoricalDtype(list(calendar.month_name)[1:], ordered=True)
+
+AQI_DAY_COUNTS = [
+    "#_Days_with_AQI", "Good", "Moderate", "Unhealthy_for_Sensitive_Groups", "Unhealthy", "Very_Unhealthy", "Hazardous",
+    "#_Days_CO", "#_Days_NO2", "#_Days_O3", "#_Days_PM2.5", "#_Days_PM10",
+]
+
+# Column dtypes per dataset. Every declared column must hold a value of its
+# type (after FILL) and lie within RANGES, or its row is rejected.
+DTYPES = {
+    AQI: {
+        "CBSA_Code": "int64",
+        "CBSA": "category",
+        **{col: "int64" for col in AQI_DAY_COUNTS},
+        "AQI_Maximum": "int64",
+        "AQI_90th_Percentile": "float64",
+        "AQI_Median": "float64",
+        "Year": "int64",
+    },
+    SNOW_DEPTH: {
+        "Site": "category",
+        "Station": "category",
+        "Water Year": "int64",
+        "Month": MONTHS,
+        "Snow Depth (in)": "float64",
+    },
+    GROUND_WATER: {
+        "System Name": "category",
+        "Depth of Well (ft)": "float64",
+        "Static Water Level (ft)": "float64",
+        "Active": "int64",
+        "Water Year": "int64",
+    },
+}
+
+# Inclusive (low, high) bounds; None leaves a side open.
+RANGES = {
+    AQI: {
+        **{col: (0, 366) for col in AQI_DAY_COUNTS},
+        "AQI_Maximum": (0, None),
+        "AQI_90th_Percentile": (0, None),
+        "AQI_Median": (0, None),
+        "Year": (1900, None),
+    },
+    SNOW_DEPTH: {
+        "Water Year": (1900, None),
+        "Snow Depth (in)": (0, None),
+    },
+    GROUND_WATER: {
+        "Depth of Well (ft)": (0, None),
+        "Water Year": (1900, None),
+    },
+}
+
+# Values used for missing entries: an empty day count means no such days.
+FILL = {
+    AQI: {col: 0 for col in AQI_DAY_COUNTS},
+}
+
+# Placeholder columns of the source files that are always zero or empty.
+DROP = {
+    AQI: ["AQI", "PM2.5", "PM10", "NO2", "CO", "O3", "Date", "Month"],
+}
+
+# Columns that identify a row; appended rows that repeat one are duplicates.
+NATURAL_KEYS = {
+    AQI: ["CBSA_Code", "Year"],
+    SNOW_DEPTH: ["Station", "Water Year", "Month"],
+    GROUND_WATER: ["System Name", "Water Year"],
+}
+
+_lock = threading.Lock()
+_cache = {}  # name -> {"signature": (mtime_ns, size), "version": sha1, "frames": {columns: DataFrame}}
+
+
+def dataset_path(name):
+    return os.path.join(DATA_DIR, name)
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_hash(path):
+    digest = hashlib.sha1(SCHEMA_REVISION.encode())
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clean(frame, name):
+    """Validate ``frame`` against the schema of dataset ``name``.
+
+    Drops the ``DROP`` columns, fills missing ``FILL`` values and casts the
+    declared columns. Returns ``(clean, rejected)``: the valid rows, typed,
+    and the other rows with their original values as text and a ``Problems``
+    column naming the columns that were missing, unparseable or out of range.
+    """
+    frame = frame.drop(columns=[col for col in DROP.get(name, []) if col in frame.columns])
+    fill, ranges = FILL.get(name, {}), RANGES.get(name, {})
+    values, problems = {}, {}
+    for col, dtype in DTYPES.get(name, {}).items():
+        if col not in frame.columns:
+            continue
+        if dtype == "category" or isinstance(dtype, pd.CategoricalDtype):
+            value = frame[col].astype(dtype)
+            bad = value.isna().to_numpy()
+        else:
+            value = pd.to_numeric(frame[col], errors="coerce")
+            if col in fill:
+                value = value.fillna(fill[col])
+            number = value.to_numpy(dtype=float, na_value=np.nan)
+            bad = np.isnan(number)
+            if dtype == "int64":
+                bad |= np.mod(number, 1) != 0
+            low, high = ranges.get(col, (None, None))
+            if low is not None:
+                bad |= number < low
+            if high is not None:
+                bad |= number > high
+        values[col] = value
+        if bad.any():
+            problems[col] = bad
+    rejected = np.logical_or.reduce(list(problems.values())) if problems else np.zeros(len(frame), dtype=bool)
+
+    report = frame[rejected].astype("string")
+    report["Problems"] = [
+        ", ".join(col for col, bad in problems.items() if bad[i]) for i in np.flatnonzero(rejected)
+    ]
+    kept = frame.assign(**values)[~rejected]
+    dtypes = {col: dtype for col, dtype in DTYPES.get(name, {}).items() if col in kept.columns}
+    return kept.astype(dtypes).reset_index(drop=True), report.reset_index(drop=True)
+
+
+def parse(path, name):
+    """Parse ``path`` as dataset ``name``; returns ``(clean, rejected)`` as ``clean`` does."""
+    return clean(pd.read_csv(path), name)
+
+
+def _entry(name):
+    path = dataset_path(name)
+    signature = _signature(path)
+    with _lock:
+        entry = _cache.get(name)
+        if entry is not None and entry["signature"] == signature:
+            return entry
+        version = _file_hash(path)
+        if entry is not None and entry["version"] == version:
+            entry["signature"] = signature
+            return entry
+        entry = {"signature": signature, "version": version, "frames": {}, "fallback": None, "rejected": None}
+        if store.stored_version(name) != version:
+            with metrics.section("parse"):
+                frame, rejected = parse(path, name)
+            try:
+                store.write(name, rejected, version, part="rejected")
+                store.write(name, frame, version)
+            except OSError:
+                # Read-only deployments keep the parsed frame in memory instead.
+                entry["fallback"], entry["rejected"] = frame, rejected
+        _cache[name] = entry
+        return entry
+
+
+def convert(name):
+    """Bring the columnar copy of ``name`` up to date and return its version."""
+    return _entry(name)["version"]
+
+
+def load(name, columns=None):
+    """Return the shared, typed frame for dataset ``name``.
+
+    ``columns`` restricts the read to those columns; each distinct projection
+    is cached separately. The result is a shallow copy of the cached frame
+    (see the module docstring). Raises ``FileNotFoundError`` if the file is
+    missing from ``data/``.
+    """
+    entry = _entry(name)
+    key = tuple(columns) if columns is not None else None
+    with _lock:
+        frame = entry["frames"].get(key)
+        metrics.count("data", frame is not None)
+        if frame is None:
+            if entry["fallback"] is not None:
+                frame = entry["fallback"] if key is None else entry["fallback"][list(key)]
+            else:
+                frame = store.read(name, columns=None if key is None else list(key))
+            entry["frames"][key] = frame
+    return frame.copy(deep=False)
+
+
+def table(name):
+    """Return dataset ``name`` as an Arrow table without converting it to pandas.
+
+    The table is memory-mapped from the columnar copy, so columns that are
+    never touched are never read.
+    """
+    entry = _entry(name)
+    if entry["fallback"] is not None:
+        return pa.Table.from_pandas(entry["fallback"], preserve_index=False)
+    return store.read_table(name)
+
+
+def rejected(name):
+    """Return the rows of dataset ``name`` that failed validation, with their problems."""
+    entry = _entry(name)
+    if entry["fallback"] is not None:
+        return entry["rejected"]
+    return store.read(name, part="rejected")
+
+
+def columns(name):
+    """Return the column names of dataset ``name`` without loading it."""
+    entry = _entry(name)
+    if entry["fallback"] is not None:
+        return list(entry["fallback"].columns)
+    return store.columns(name)
+
+
+def dataset_version(name):
+    """Return the content (and schema) hash of the currently loaded version of ``name``."""
+    return _entry(name)["version"]
+
+
+def load_aqi(columns=None):
+    return load(AQI, columns)
+
+
+def load_snow_depth(columns=None):
+    return load(SNOW_DEPTH, columns)
+
+
+def load_ground_water(columns=None):
+    return load(GROUND_WATER, columns)
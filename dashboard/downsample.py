@@ -0,0 +1,100 @@
+"""Bounded-size series for charts.
+
+Charts are at most ``figures.MAX_WIDTH`` pixels wide (Streamlit's content
+width), so more than about one point per two pixels or one bar per
+``BAR_PIXELS`` cannot be told apart. Queries that feed charts
+take a ``max_points`` or ``max_bars`` budget and reduce longer results here:
+
+* ``series`` and ``frame`` keep the points picked by Largest-Triangle-Three-
+  Buckets (LTTB), which preserves peaks and dips that averaging would flatten.
+* ``bins`` sums or averages consecutive rows into wider bars, labelled with
+  the first and last index value they cover, e.g. ``1980–1984``.
+
+Results at or under the budget are returned unchanged.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from dashboard.figures import MAX_WIDTH
+
+MAX_POINTS = MAX_WIDTH // 2
+BAR_PIXELS = 24
+MAX_BARS = MAX_WIDTH // BAR_PIXELS
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points of ``(x, y)`` picked by LTTB, in order."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # The first and last points are kept; the rest is split into threshold - 2 buckets.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x, next_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def _positions(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return index.asi8.astype(float)
+    return np.asarray(index, dtype=float)
+
+
+def series(values, max_points=MAX_POINTS):
+    """``values`` reduced to at most ``max_points`` points with LTTB; missing values are dropped."""
+    if max_points is None or len(values) <= max_points:
+        return values
+    values = values.dropna()
+    return values.iloc[lttb(_positions(values.index), values.to_numpy(dtype=float), max_points)]
+
+
+def frame(values, max_points=MAX_POINTS):
+    """Rows of ``values`` picked by LTTB on each column, at most ``max_points`` in all."""
+    if max_points is None or len(values) <= max_points:
+        return values
+    positions = _positions(values.index)
+    per_column = max(3, max_points // max(1, values.shape[1]))
+    keep = set()
+    for col in values.columns:
+        column = values[col].to_numpy(dtype=float, na_value=np.nan)
+        valid = np.flatnonzero(~np.isnan(column))
+        keep.update(valid[lttb(positions[valid], column[valid], per_column)])
+    return values.iloc[sorted(keep)]
+
+
+def bins(values, max_bars=MAX_BARS, how="sum"):
+    """Rows of ``values`` aggregated with ``how`` into at most ``max_bars`` bins.
+
+    A numeric index, such as years, is cut into bins of equal span, so gaps
+    in the index do not shift the bins; any other index is cut every few rows.
+    """
+    if max_bars is None or len(values) <= max_bars:
+        return values
+    index = values.index.to_numpy()
+    if pd.api.types.is_numeric_dtype(index):
+        first, last = index.min(), index.max()
+        width = math.ceil((last - first + 1) / max_bars)
+        groups = (index - first) // width
+        binned = values.groupby(groups).agg(how)
+        labels = [f"{first + g * width}–{min(first + (g + 1) * width - 1, last)}" for g in binned.index]
+    else:
+        width = math.ceil(len(values) / max_bars)
+        binned = values.groupby(np.arange(len(values)) // width).agg(how)
+        labels = [f"{index[g * width]}–{index[min((g + 1) * width, len(index)) - 1]}" for g in binned.index]
+    binned.index = pd.Index(labels, name=values.index.name)
+    return binned
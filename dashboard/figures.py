@@ -0,0 +1,154 @@
+"""Cache of rendered chart images shared by every session.
+
+Charts are drawn on a standalone ``matplotlib.figure.Figure`` (not the global
+``pyplot`` state, which is not safe across concurrent sessions) and stored as
+PNG or SVG bytes. The cache key is the chart id, the filter parameters the
+chart depends on and the versions of the datasets it reads, so a chart that
+ignores the sidebar is rendered once per dataset version for all users.
+Entries are evicted least-recently-used once the cache exceeds its byte cap,
+configurable with ``DASHBOARD_FIGURE_CACHE_MB``.
+
+PNGs are stored already scaled down to Streamlit's maximum content width;
+``st.image`` would otherwise decode, resize and re-encode a wider image on
+every rerun, even when it comes straight from the cache.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+from matplotlib.figure import Figure
+from PIL import Image
+
+from dashboard import data, metrics, precompute
+
+MAX_BYTES = int(float(os.environ.get("DASHBOARD_FIGURE_CACHE_MB", "64")) * 1024 * 1024)
+
+# Same output settings st.pyplot uses, so cached images look unchanged.
+SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200}
+
+# Widest image st.image shows without resizing it first.
+MAX_WIDTH = 1460
+
+
+class FigureCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+cache = FigureCache()
+
+
+def _freeze(params):
+    if isinstance(params, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in params.items()))
+    if isinstance(params, (list, tuple)):
+        return tuple(_freeze(v) for v in params)
+    return params
+
+
+def _fit_width(png):
+    image = Image.open(io.BytesIO(png))
+    if image.width <= MAX_WIDTH:
+        return png
+    height = int(1.0 * image.height * MAX_WIDTH / image.width)
+    buffer = io.BytesIO()
+    image.resize((MAX_WIDTH, height), resample=Image.BILINEAR).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def carry_over(name, old_version, new_version, first_year):
+    """Keep images of charts that end before rows from ``first_year`` were appended.
+
+    After an append took dataset ``name`` from ``old_version`` to
+    ``new_version``, a chart with a ``years`` filter ending before
+    ``first_year`` looks the same. The rule is stored in the shared cache of
+    ``dashboard.precompute``, so every process running the dashboards reuses
+    its own images of ``old_version`` for such charts instead of redrawing.
+    """
+    precompute.save(("carry_over", name), (new_version,), {"version": old_version, "before": int(first_year)})
+
+
+def _carried(key, params, datasets):
+    """Image of ``key`` cached under the versions before an append that did not touch it."""
+    chart_id, frozen, versions, figsize, fmt = key
+    if "years" not in params:
+        return None
+    older = list(versions)
+    for i, name in enumerate(datasets):
+        rule = precompute.stored(("carry_over", name), (versions[i],))
+        if rule is not None and params["years"][1] < rule["before"]:
+            older[i] = rule["version"]
+    if older == list(versions):
+        return None
+    return cache.get((chart_id, frozen, tuple(older), figsize, fmt))
+
+
+def render(chart_id, draw, params=None, datasets=(), figsize=(10, 6), fmt="png"):
+    """Return the image bytes of a chart, drawing it only on a cache miss.
+
+    ``draw`` receives an empty ``Figure`` and must draw the whole chart on it.
+    ``params`` holds every filter value the chart depends on and ``datasets``
+    the names of the datasets it reads.
+    """
+    versions = tuple(data.dataset_version(name) for name in datasets)
+    key = (chart_id, _freeze(params or {}), versions, tuple(figsize), fmt)
+    image = cache.get(key)
+    if image is None:
+        image = _carried(key, params or {}, datasets)
+        if image is not None:
+            cache.put(key, image)
+    metrics.count("figures", image is not None)
+    if image is None:
+        with metrics.section("draw"):
+            fig = Figure(figsize=figsize)
+            draw(fig)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, **SAVEFIG_OPTIONS)
+            image = buffer.getvalue()
+            if fmt == "png":
+                image = _fit_width(image)
+        if not precompute.served_stale():
+            # A chart of stale results must not be cached under the new versions.
+            cache.put(key, image)
+    return image
+
+
+def show(chart_id, draw, params=None, datasets=(), figsize=(10, 6), fmt="png"):
+    """Render a chart through the cache and display it with ``st.image``."""
+    image = render(chart_id, draw, params, datasets, figsize, fmt)
+    st.image(image.decode() if fmt == "svg" else image, width="stretch")
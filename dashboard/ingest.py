@@ -0,0 +1,294 @@
+"""Chunked ingestion of raw AQI and groundwater feeds.
+
+Raw files are read in bounded chunks with ``pd.read_csv(chunksize=...)``,
+cleaned, and folded into running per-year aggregates, so peak memory depends
+on the number of (key, year) groups rather than on the size of the input.
+
+* ``aqi_annual`` turns EPA daily AQI files (``daily_aqi_by_cbsa_YYYY.csv``)
+  into the annual per-CBSA table of ``aqi_combined_1980_2024.csv``. Median and
+  90th percentile AQI are exact, computed from a per-group AQI histogram.
+* ``ground_water_annual`` turns well-level measurement records into one row per
+  (System Name, Water Year) with the mean well depth and static water level,
+  plus a ``Measurements`` column that ``dashboard.cube`` uses as a weight so
+  yearly means still reflect every raw measurement.
+
+New rows for an existing dataset go through ``append`` instead of a full
+rebuild. Rows are deduplicated on the dataset's natural keys, and a
+per-dataset high-water mark of the latest year makes repeated runs no-ops.
+Cached chart images whose year range ends before the appended years stay
+valid in every running dashboard (see ``figures.carry_over``).
+
+    python -m dashboard.ingest aqi raw/daily_aqi_by_cbsa_*.csv -o data/aqi_combined_1980_2024.csv
+    python -m dashboard.ingest ground-water raw/wells.csv -o data/fixed_ground_water_cleaned.csv
+    python -m dashboard.ingest append aqi_combined_1980_2024.csv new_rows.csv
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dashboard import cube, data, figures
+from dashboard.cube import WEIGHT
+
+CHUNK_ROWS = 250_000
+
+DAILY_AQI_COLUMNS = ["CBSA", "CBSA Code", "Date", "AQI", "Category", "Defining Parameter"]
+CATEGORY_COLUMNS = {
+    "Good": "Good",
+    "Moderate": "Moderate",
+    "Unhealthy for Sensitive Groups": "Unhealthy_for_Sensitive_Groups",
+    "Unhealthy": "Unhealthy",
+    "Very Unhealthy": "Very_Unhealthy",
+    "Hazardous": "Hazardous",
+}
+PARAMETER_COLUMNS = {
+    "CO": "#_Days_CO",
+    "NO2": "#_Days_NO2",
+    "Ozone": "#_Days_O3",
+    "PM2.5": "#_Days_PM2.5",
+    "PM10": "#_Days_PM10",
+}
+AQI_KEY = ["CBSA_Code", "CBSA", "Year"]
+AQI_COLUMNS = (
+    AQI_KEY[:2] + ["#_Days_with_AQI"] + list(CATEGORY_COLUMNS.values())
+    + ["AQI_Maximum", "AQI_90th_Percentile", "AQI_Median"] + list(PARAMETER_COLUMNS.values()) + ["Year"]
+)
+
+GROUND_WATER_MEASURES = ["Depth of Well (ft)", "Static Water Level (ft)"]
+GROUND_WATER_KEY = ["System Name", "Water Year"]
+GROUND_WATER_COLUMNS = ["System Name"] + GROUND_WATER_MEASURES + ["Active", "Water Year", WEIGHT]
+
+
+def read_chunks(paths, chunksize=CHUNK_ROWS, **kwargs):
+    """Yield ``pd.read_csv`` chunks of at most ``chunksize`` rows from each path."""
+    for path in paths:
+        yield from pd.read_csv(path, chunksize=chunksize, **kwargs)
+
+
+def _fold(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+def clean_daily_aqi(chunk, state="NM"):
+    """Keep valid daily AQI rows for CBSAs in ``state`` (all states if None)."""
+    chunk = chunk.rename(columns={"CBSA Code": "CBSA_Code"})
+    chunk["AQI"] = pd.to_numeric(chunk["AQI"], errors="coerce")
+    chunk["Year"] = pd.to_datetime(chunk["Date"], errors="coerce").dt.year
+    chunk = chunk.dropna(subset=["CBSA_Code", "CBSA", "AQI", "Year"])
+    if state:
+        states = chunk["CBSA"].str.rsplit(",", n=1).str[-1]
+        chunk = chunk[states.str.contains(state, regex=False)]
+    return chunk.astype({"CBSA_Code": "int64", "AQI": "int64", "Year": "int64"})
+
+
+def _weighted_percentile(values, counts, q):
+    # Same result as np.percentile(np.repeat(values, counts), q * 100).
+    cumulative = np.cumsum(counts)
+    position = q * (cumulative[-1] - 1)
+    lower, upper = int(np.floor(position)), int(np.ceil(position))
+    low = values[np.searchsorted(cumulative, lower, side="right")]
+    high = values[np.searchsorted(cumulative, upper, side="right")]
+    return low + (high - low) * (position - lower)
+
+
+def _histogram_stats(histogram):
+    stats = {}
+    for key, counts in histogram.groupby(level=AQI_KEY):
+        values = counts.index.get_level_values("AQI").to_numpy(dtype=float)
+        order = np.argsort(values)
+        values, counts = values[order], counts.to_numpy()[order]
+        stats[key] = {
+            "AQI_Maximum": values[-1],
+            "AQI_90th_Percentile": _weighted_percentile(values, counts, 0.9),
+            "AQI_Median": _weighted_percentile(values, counts, 0.5),
+        }
+    frame = pd.DataFrame.from_dict(stats, orient="index")
+    frame.index = pd.MultiIndex.from_tuples(frame.index, names=AQI_KEY)
+    return frame
+
+
+def aqi_annual(paths, state="NM", chunksize=CHUNK_ROWS):
+    """Fold EPA daily AQI files into the annual per-CBSA dashboard table."""
+    days = categories = parameters = histogram = None
+    for chunk in read_chunks(paths, chunksize, usecols=DAILY_AQI_COLUMNS, dtype={"CBSA": str}):
+        chunk = clean_daily_aqi(chunk, state)
+        if chunk.empty:
+            continue
+        days = _fold(days, chunk.groupby(AQI_KEY).size())
+        categories = _fold(categories, chunk.groupby(AQI_KEY + ["Category"]).size())
+        parameters = _fold(parameters, chunk.groupby(AQI_KEY + ["Defining Parameter"]).size())
+        histogram = _fold(histogram, chunk.groupby(AQI_KEY + ["AQI"]).size())
+    if days is None:
+        return pd.DataFrame(columns=AQI_COLUMNS)
+
+    # Categories and parameters that never occur are left empty, as in the
+    # cleaned CSV the dashboards were built on.
+    annual = days.rename("#_Days_with_AQI").to_frame()
+    annual = annual.join(
+        categories.unstack("Category").reindex(columns=list(CATEGORY_COLUMNS)).rename(columns=CATEGORY_COLUMNS)
+    )
+    annual = annual.join(
+        parameters.unstack("Defining Parameter").reindex(columns=list(PARAMETER_COLUMNS)).rename(columns=PARAMETER_COLUMNS)
+    )
+    annual = annual.join(_histogram_stats(histogram))
+    annual = annual.reset_index().sort_values(["Year", "CBSA_Code"])
+    return annual.astype({"#_Days_with_AQI": "int64", "AQI_Maximum": "int64"})[AQI_COLUMNS]
+
+
+def clean_ground_water(chunk, date_column=None):
+    """Keep well measurements with a system, a positive depth and level and a water year.
+
+    The water year comes from a ``Water Year`` column when present, otherwise
+    from ``date_column`` (October through September, named after the year it
+    ends in).
+    """
+    if "Water Year" not in chunk.columns:
+        dates = pd.to_datetime(chunk[date_column], errors="coerce")
+        chunk = chunk.assign(**{"Water Year": dates.dt.year + (dates.dt.month >= 10)})
+    chunk = chunk.assign(
+        **{"System Name": chunk["System Name"].astype(str).str.strip().str.upper()},
+        **{col: pd.to_numeric(chunk[col], errors="coerce") for col in GROUND_WATER_MEASURES + ["Water Year"]},
+    )
+    if "Active" not in chunk.columns:
+        chunk = chunk.assign(Active=-1)
+    chunk = chunk.dropna(subset=GROUND_WATER_MEASURES + ["Water Year"])
+    chunk = chunk[(chunk[GROUND_WATER_MEASURES] > 0).all(axis=1) & (chunk["System Name"] != "")]
+    return chunk.astype({"Water Year": "int64"})
+
+
+def ground_water_annual(paths, date_column=None, chunksize=CHUNK_ROWS):
+    """Fold well-level records into per-(System Name, Water Year) means."""
+    wanted = set(GROUND_WATER_COLUMNS) | {date_column}
+    sums = counts = active = None
+    for chunk in read_chunks(paths, chunksize, usecols=lambda col: col in wanted):
+        chunk = clean_ground_water(chunk, date_column)
+        if chunk.empty:
+            continue
+        groups = chunk.groupby(GROUND_WATER_KEY)
+        sums = _fold(sums, groups[GROUND_WATER_MEASURES].sum())
+        counts = _fold(counts, groups.size())
+        part = groups["Active"].min()
+        active = part if active is None else pd.concat([active, part]).groupby(level=GROUND_WATER_KEY).min()
+    if counts is None:
+        return pd.DataFrame(columns=GROUND_WATER_COLUMNS)
+
+    annual = sums.div(counts, axis=0)
+    annual["Active"] = active
+    annual[WEIGHT] = counts
+    annual = annual.reset_index().sort_values(GROUND_WATER_KEY)
+    return annual.astype({"Active": "int64", WEIGHT: "int64"})[GROUND_WATER_COLUMNS]
+
+
+def write_csv(frame, path):
+    """Write ``frame`` to ``path`` atomically so loaders never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+WATERMARKS_PATH = os.path.join(data.DATA_DIR, ".watermarks.json")
+
+
+def watermarks():
+    """Return the latest appended year per dataset."""
+    try:
+        with open(WATERMARKS_PATH) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_watermark(name, year):
+    marks = watermarks()
+    marks[name] = int(year)
+    tmp_path = f"{WATERMARKS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(marks, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, WATERMARKS_PATH)
+
+
+def new_rows(name, rows):
+    """Return the part of ``rows`` that is not yet in dataset ``name``.
+
+    Rows older than the dataset's high-water mark are dropped, as are rows
+    whose natural key already exists. Of several rows in ``rows`` with the
+    same key, the last one is kept, so a later correction wins.
+    """
+    year_col = cube.LAYOUTS[name][0]
+    mark = watermarks().get(name)
+    if mark is not None:
+        rows = rows[rows[year_col] >= mark]
+    keys = data.NATURAL_KEYS[name]
+    existing = pd.MultiIndex.from_frame(data.load(name, keys).astype(str))
+    rows = rows[~pd.MultiIndex.from_frame(rows[keys].astype(str)).isin(existing)]
+    return rows.drop_duplicates(subset=keys, keep="last")
+
+
+def append(name, rows):
+    """Append new ``rows`` to dataset ``name``.
+
+    Returns ``(added, rejected)``: the number of rows appended and the rows
+    that failed ``data.clean``, with their ``Problems``. Besides the CSV
+    itself, the aggregate cube is extended with the new rows and stored for
+    every process, and charts whose year range ends before the first new year
+    keep their cached images.
+    """
+    path = data.dataset_path(name)
+    header = pd.read_csv(path, nrows=0).columns
+    rows, rejected = data.clean(rows.reindex(columns=header), name)
+    rows = new_rows(name, rows)
+    if rows.empty:
+        return 0, rejected
+
+    year_col, key_col, measures = cube.LAYOUTS[name]
+    old_version = data.dataset_version(name)
+    old_cube = cube.get(name)
+    with open(path, "rb+") as handle:
+        handle.seek(-1, os.SEEK_END)
+        if handle.read(1) != b"\n":
+            handle.write(b"\n")
+    rows.reindex(columns=header).to_csv(path, mode="a", header=False, index=False)
+
+    new_version = data.dataset_version(name)
+    first_year = rows[year_col].min()
+    frame = data.load(name, [year_col, key_col] + measures + ([WEIGHT] if old_cube.weight_col else []))
+    cube.put(name, new_version, old_cube.extend(rows, frame))
+    figures.carry_over(name, old_version, new_version, first_year)
+    _save_watermark(name, max(rows[year_col].max(), watermarks().get(name, rows[year_col].max())))
+    return len(rows), rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold raw AQI or groundwater files into dashboard tables.")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk (default %(default)s)")
+    sub = parser.add_subparsers(dest="dataset", required=True)
+    aqi = sub.add_parser("aqi", help="EPA daily AQI by CBSA files")
+    aqi.add_argument("--state", default="NM", help="state code to keep, or '' for all (default %(default)s)")
+    ground = sub.add_parser("ground-water", help="well-level groundwater records")
+    ground.add_argument("--date-column", help="measurement date column, if there is no 'Water Year' column")
+    for command in (aqi, ground):
+        command.add_argument("paths", nargs="+")
+        command.add_argument("-o", "--output", required=True)
+    extra = sub.add_parser("append", help="append new rows to a dataset in data/")
+    extra.add_argument("name", choices=sorted(data.NATURAL_KEYS))
+    extra.add_argument("rows", help="CSV file with the new rows, same columns as the dataset")
+    args = parser.parse_args(argv)
+
+    if args.dataset == "append":
+        added, rejected = append(args.name, pd.read_csv(args.rows))
+        print(f"Appended {added} new rows to {args.name} ({len(rejected)} rows rejected)")
+        for problems, count in rejected["Problems"].value_counts().items():
+            print(f"  {count} rows with bad {problems}")
+        return
+    if args.dataset == "aqi":
+        table = aqi_annual(args.paths, state=args.state or None, chunksize=args.chunk_rows)
+    else:
+        table = ground_water_annual(args.paths, date_column=args.date_column, chunksize=args.chunk_rows)
+    write_csv(table, args.output)
+    print(f"Wrote {len(table)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Per-section timing, memory and cache instrumentation.
+
+Pages call ``begin(page)`` once and wrap each load step and section in
+``with section(name):``. Sections nest (a chart drawn inside a section is
+recorded as ``"<section> / draw"``) and each records wall time, CPU time of
+the session's thread, the change in process memory and the cache hits and
+misses counted with ``count`` while it ran. A record costs two clock reads,
+two ``/proc`` reads and a dict update, so it is left on in production.
+
+Where the records go:
+
+* ``panel()`` shows the current run's records in a sidebar expander when
+  ``DASHBOARD_DEBUG=1`` or the page URL has ``?debug=1``.
+* ``prometheus()`` renders process-wide totals in the Prometheus text format;
+  ``dashboard.service`` serves it at ``/metrics``.
+  ``DASHBOARD_PROMETHEUS_FILE`` names a file the same text is rewritten to
+  at most every ``PROMETHEUS_INTERVAL`` seconds, for a textfile collector.
+* ``DASHBOARD_METRICS_LOG`` names a file that gets one JSON line per record.
+
+Memory is the change in resident set size; with ``DASHBOARD_TRACE_MEMORY=1``
+it is the change in memory allocated by Python (``tracemalloc``), which is
+exact per section but too slow to leave on.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+DEBUG = os.environ.get("DASHBOARD_DEBUG", "") == "1"
+LOG_PATH = os.environ.get("DASHBOARD_METRICS_LOG")
+PROMETHEUS_PATH = os.environ.get("DASHBOARD_PROMETHEUS_FILE")
+PROMETHEUS_INTERVAL = 10.0
+# Records kept per thread; threads that never call ``begin`` (e.g. service workers) keep the latest.
+MAX_RECORDS = 1000
+if os.environ.get("DASHBOARD_TRACE_MEMORY", "") == "1":
+    tracemalloc.start()
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_local = threading.local()
+_lock = threading.Lock()
+_sections = defaultdict(lambda: [0, 0.0, 0.0])  # (page, section) -> [runs, wall seconds, cpu seconds]
+_caches = defaultdict(int)  # (cache, "hit" | "miss") -> events
+_last_export = [0.0]
+
+
+def _memory_mb():
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0] / 2**20
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, IndexError, ValueError):
+        return float("nan")
+
+
+def begin(page):
+    """Start recording a run of ``page`` in the current session thread."""
+    _local.page = page
+    _local.stack = []
+    _local.records = deque(maxlen=MAX_RECORDS)
+
+
+def page():
+    """Return the page being recorded in the current session thread, or None."""
+    return getattr(_local, "page", None)
+
+
+def records():
+    """Return the records of the current run, in the order sections finished."""
+    return list(getattr(_local, "records", []))
+
+
+@contextmanager
+def section(name):
+    """Record wall time, CPU time, memory and cache events of the enclosed block."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        begin("-")
+        stack = _local.stack
+    full_name = " / ".join([frame["section"] for frame in stack[-1:]] + [name])
+    frame = {"section": full_name, "hits": 0, "misses": 0}
+    stack.append(frame)
+    memory = _memory_mb()
+    cpu = time.thread_time()
+    wall = time.perf_counter()
+    try:
+        yield
+    finally:
+        frame["wall_s"] = time.perf_counter() - wall
+        frame["cpu_s"] = time.thread_time() - cpu
+        frame["memory_mb"] = _memory_mb() - memory
+        stack.pop()
+        frame = dict(frame, page=_local.page)
+        _local.records.append(frame)
+        with _lock:
+            totals = _sections[(frame["page"], full_name)]
+            totals[0] += 1
+            totals[1] += frame["wall_s"]
+            totals[2] += frame["cpu_s"]
+        if LOG_PATH:
+            with _lock, open(LOG_PATH, "a") as handle:
+                handle.write(json.dumps(dict(frame, time=time.time())) + "\n")
+        if PROMETHEUS_PATH and not stack and time.monotonic() - _last_export[0] > PROMETHEUS_INTERVAL:
+            _last_export[0] = time.monotonic()
+            _export(PROMETHEUS_PATH)
+
+
+def count(cache, hit):
+    """Count a hit or miss of ``cache`` for the process and the open sections."""
+    result = "hit" if hit else "miss"
+    with _lock:
+        _caches[(cache, result)] += 1
+    for frame in getattr(_local, "stack", []):
+        frame["hits" if hit else "misses"] += 1
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def prometheus():
+    """Return process-wide section and cache totals in the Prometheus text format."""
+    with _lock:
+        sections = {key: list(value) for key, value in _sections.items()}
+        caches = dict(_caches)
+    lines = [
+        "# HELP dashboard_section_runs_total Runs of each dashboard section.",
+        "# TYPE dashboard_section_runs_total counter",
+    ]
+    lines += [f'dashboard_section_runs_total{{page="{_label(p)}",section="{_label(s)}"}} {v[0]}' for (p, s), v in sections.items()]
+    lines += [
+        "# HELP dashboard_section_seconds_total Wall time spent in each dashboard section.",
+        "# TYPE dashboard_section_seconds_total counter",
+    ]
+    lines += [f'dashboard_section_seconds_total{{page="{_label(p)}",section="{_label(s)}"}} {v[1]:.6f}' for (p, s), v in sections.items()]
+    lines += [
+        "# HELP dashboard_section_cpu_seconds_total CPU time spent in each dashboard section.",
+        "# TYPE dashboard_section_cpu_seconds_total counter",
+    ]
+    lines += [f'dashboard_section_cpu_seconds_total{{page="{_label(p)}",section="{_label(s)}"}} {v[2]:.6f}' for (p, s), v in sections.items()]
+    lines += [
+        "# HELP dashboard_cache_events_total Cache lookups by cache and result.",
+        "# TYPE dashboard_cache_events_total counter",
+    ]
+    lines += [f'dashboard_cache_events_total{{cache="{_label(c)}",result="{r}"}} {n}' for (c, r), n in caches.items()]
+    return "\n".join(lines) + "\n"
+
+
+def _export(path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as handle:
+        handle.write(prometheus())
+    os.replace(tmp, path)
+
+
+def panel():
+    """Show the current run's records in the sidebar when debugging is enabled."""
+    import pandas as pd
+    import streamlit as st
+
+    if not (DEBUG or st.query_params.get("debug") == "1"):
+        return
+    frame = pd.DataFrame(records(), columns=["section", "wall_s", "cpu_s", "memory_mb", "hits", "misses"])
+    with st.sidebar.expander("Performance", expanded=True):
+        st.dataframe(
+            frame.rename(columns={
+                "section": "Section", "wall_s": "Wall (s)", "cpu_s": "CPU (s)", "memory_mb": "Memory (MB)",
+                "hits": "Cache Hits", "misses": "Cache Misses",
+            }),
+            hide_index=True,
+        )
+        st.caption(f"Total wall time of top-level sections: {frame.loc[~frame['section'].str.contains(' / '), 'wall_s'].sum():.3f} s")
@@ -0,0 +1,128 @@
+"""Dense [site, year, month] array of the snow depth measurements.
+
+The long snow depth table repeats every site, station and month name on each
+row. ``MonthlyGrid`` keeps the mean depth over a site's stations in one
+``float32`` array indexed by site code, year offset and month (only months
+that have measurements get a slot; NaN where a site has none), with the site
+names and months as indexes next to it. One grid per dataset version is
+shared by every session, and ``site`` and ``month`` return views into it, so
+per-site and per-month breakdowns copy nothing until they are reduced.
+"""
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data, metrics, precompute
+
+SNOW = "Snow Depth (in)"
+
+
+class MonthlyGrid:
+    def __init__(self, frame, site_col="Site", year_col="Water Year", month_col="Month", measure=SNOW):
+        sites = frame[site_col]
+        months = frame[month_col]
+        self.sites = pd.Index(sites.cat.categories, name=site_col)
+        year_values = frame[year_col].to_numpy()
+        self.years = np.arange(year_values.min(), year_values.max() + 1)
+        month_codes = months.cat.codes.to_numpy()
+        observed = np.unique(month_codes[month_codes >= 0])
+        self.months = pd.CategoricalIndex(
+            months.cat.categories[observed], categories=months.cat.categories, ordered=True, name=month_col
+        )
+
+        month_slot = np.full(len(months.cat.categories), -1)
+        month_slot[observed] = np.arange(len(observed))
+        shape = (len(self.sites), len(self.years), len(self.months))
+        values = frame[measure].to_numpy(dtype=float, na_value=np.nan)
+        site_codes = sites.cat.codes.to_numpy()
+        valid = ~np.isnan(values) & (site_codes >= 0) & (month_codes >= 0)
+        cell = np.ravel_multi_index(
+            (site_codes[valid], year_values[valid] - self.years[0], month_slot[month_codes[valid]]), shape
+        )
+        size = int(np.prod(shape))
+        total = np.bincount(cell, weights=values[valid], minlength=size)
+        count = np.bincount(cell, minlength=size)
+        with np.errstate(all="ignore"):
+            self.depth = (total / count).astype(np.float32).reshape(shape)
+
+    def _year_bounds(self, years):
+        if years is None:
+            return 0, len(self.years)
+        return max(0, years[0] - self.years[0]), max(0, years[1] - self.years[0] + 1)
+
+    def site(self, site, years=None):
+        """Years x months view of ``site``."""
+        first, stop = self._year_bounds(years)
+        return self.depth[self.sites.get_loc(site), first:stop]
+
+    def month(self, month, years=None):
+        """Sites x years view of ``month``."""
+        first, stop = self._year_bounds(years)
+        return self.depth[:, first:stop, self.months.get_loc(month)]
+
+    def history(self, site=None, years=None):
+        """Monthly depth of ``site`` over ``years``, indexed by the first day of each month.
+
+        With ``site`` None, each month's value is the mean over every site.
+        Months without a measurement are left out.
+        """
+        first, stop = self._year_bounds(years)
+        if site is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                block = np.nanmean(self.depth[:, first:stop], axis=0)
+        else:
+            block = self.site(site, years)
+        years = self.years[first:stop]
+        dates = pd.to_datetime(pd.DataFrame({
+            "year": np.repeat(years, len(self.months)),
+            "month": np.tile(self.months.codes + 1, len(years)),
+            "day": 1,
+        }))
+        history = pd.Series(block.ravel(), index=pd.DatetimeIndex(dates, name="Month"), name=SNOW)
+        return history.dropna()
+
+    def profile(self, site=None, years=None):
+        """Mean, lowest and highest monthly depth over ``years``, per month.
+
+        With ``site`` None, each year's value is the mean over every site.
+        """
+        first, stop = self._year_bounds(years)
+        block = self.depth[:, first:stop] if site is None else self.site(site, years)
+        with warnings.catch_warnings():
+            # Months without measurements are dropped below; their all-NaN warnings are noise.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if site is None:
+                block = np.nanmean(block, axis=0)
+            frame = pd.DataFrame({
+                "Mean": np.nanmean(block, axis=0),
+                "Lowest": np.nanmin(block, axis=0),
+                "Highest": np.nanmax(block, axis=0),
+                "Years": (~np.isnan(block)).sum(axis=0),
+            }, index=self.months)
+        return frame[frame["Years"] > 0]
+
+
+_lock = threading.Lock()
+_cache = {}  # name -> (dataset version, MonthlyGrid)
+
+
+def get(name=data.SNOW_DEPTH):
+    """Return the grid of dataset ``name`` for its current version."""
+    version = data.dataset_version(name)
+    with _lock:
+        cached = _cache.get(name)
+        metrics.count("monthly", cached is not None and cached[0] == version)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        def build():
+            with metrics.section("monthly"):
+                return MonthlyGrid(data.load(name, ["Site", "Water Year", "Month", SNOW]))
+
+        grid, fresh = precompute.lookup(("monthly", name), (version,), build)
+        if fresh:
+            _cache[name] = (version, grid)
+        return grid
@@ -0,0 +1,259 @@
+"""Shared on-disk cache of the heavy results, filled by a background worker.
+
+The aggregate cubes, the monthly snow grid, the per-key trend tables and the
+correlation results
+are stored in ``PRECOMPUTE_DIR`` (default ``<store dir>/precomputed``), one
+pickle per result tagged with the dataset versions it was computed from.
+``lookup`` is the read path used by ``dashboard.cube``, ``dashboard.trends``
+and ``dashboard.correlation`` on an in-memory miss: a stored result for the
+current versions is returned as is; otherwise the result is computed inline
+and stored for every other process.
+
+The worker computes every result for the current dataset versions ahead of
+the dashboards, spreading them over a process pool::
+
+    python -m dashboard.precompute --processes 4
+    python -m dashboard.precompute --watch 60      # rerun whenever the data changes
+
+While it runs, its progress is kept in ``status.json`` and a dashboard that
+finds only a result for older versions shows that one instead of computing
+the new one inline (stale-while-revalidate); ``indicator()`` tells the user.
+
+Results are pickles, and unpickling runs code, so the directory must only be
+writable by the account running the dashboards and the worker (they must run
+as the same user). It is created private, results are written readable by
+that user only, and files owned by anyone else or writable by group or others
+are ignored.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dashboard import data, metrics, store
+
+PRECOMPUTE_DIR = os.environ.get("DASHBOARD_PRECOMPUTE_DIR", os.path.join(store.STORE_DIR, "precomputed"))
+STATUS_PATH = os.path.join(PRECOMPUTE_DIR, "status.json")
+
+# Set in the worker's processes, which must never serve stale results.
+WORKER = False
+
+_local = threading.local()
+_lock = threading.Lock()
+_loaded = {}  # path -> (mtime_ns, versions, result)
+
+
+def _trusted(stat):
+    """Whether a cache file was written by this user and only they can change it."""
+    if not hasattr(os, "getuid"):
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def _path(key):
+    return os.path.join(PRECOMPUTE_DIR, hashlib.sha1(repr(key).encode()).hexdigest()[:20] + ".pkl")
+
+
+def _read(key):
+    """Return ``(versions, result)`` stored for ``key``, or None."""
+    path = _path(key)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not _trusted(stat):
+        return None
+    mtime = stat.st_mtime_ns
+    with _lock:
+        loaded = _loaded.get(path)
+    if loaded is not None and loaded[0] == mtime:
+        return loaded[1:]
+    try:
+        with open(path, "rb") as handle:
+            stored = pickle.load(handle)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if stored["key"] != key:
+        return None
+    with _lock:
+        _loaded[path] = (mtime, stored["versions"], stored["result"])
+    return stored["versions"], stored["result"]
+
+
+def save(key, versions, result):
+    """Store ``result`` of ``key`` computed from dataset ``versions``."""
+    path = _path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(PRECOMPUTE_DIR, mode=0o700, exist_ok=True)
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as handle:
+            pickle.dump({"key": key, "versions": versions, "result": result}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Read-only deployments keep results in memory only.
+        return
+    with _lock:
+        _loaded[path] = (os.stat(path).st_mtime_ns, versions, result)
+
+
+def stored(key, versions):
+    """Return the result stored for ``key`` on dataset ``versions``, or None."""
+    found = _read(key)
+    if found is None or found[0] != tuple(versions):
+        return None
+    return found[1]
+
+
+def lookup(key, versions, compute):
+    """Return ``(result, fresh)`` for ``key`` on dataset ``versions``.
+
+    ``fresh`` is False when an older result is returned because the worker
+    is still rebuilding, or the result was computed from one; callers must
+    not cache it as current.
+    """
+    versions = tuple(versions)
+    stored = _read(key)
+    metrics.count("precompute", stored is not None and stored[0] == versions)
+    if stored is not None and stored[0] == versions:
+        return stored[1], True
+    if stored is not None and not WORKER and rebuilding():
+        _local.stale = served_stale() + 1
+        return stored[1], False
+    before = served_stale()
+    result = compute()
+    if served_stale() > before:
+        # Built from another stale result: usable now, but not as the current one.
+        return result, False
+    save(key, versions, result)
+    return result, True
+
+
+def served_stale():
+    """Number of stale results returned in this thread since ``reset``."""
+    return getattr(_local, "stale", 0)
+
+
+def reset():
+    _local.stale = 0
+
+
+def status():
+    """Return the worker's status, or None if it never ran here."""
+    try:
+        with open(STATUS_PATH) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def rebuilding():
+    """Whether a worker is currently computing results."""
+    current = status()
+    return current is not None and current.get("finished") is None and _alive(current["pid"])
+
+
+def _write_status(current):
+    os.makedirs(PRECOMPUTE_DIR, mode=0o700, exist_ok=True)
+    tmp_path = f"{STATUS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(current, handle)
+    os.replace(tmp_path, STATUS_PATH)
+
+
+def _jobs():
+    """Stages of ``(job name, function)``; a stage only reads results of earlier stages."""
+    from dashboard import cube, monthly, queries, trends
+
+    return [
+        [(f"cube {name}", lambda name=name: cube.get(name)) for name in cube.LAYOUTS] + [("monthly snow depth", monthly.get)],
+        [
+            ("trends AQI", lambda: trends.get(data.AQI, "AQI_Median")),
+            ("trends snow depth", lambda: trends.get(data.SNOW_DEPTH, queries.SNOW)),
+            ("trends water level", lambda: trends.get(data.GROUND_WATER, queries.WATER_LEVEL)),
+            ("correlation intervals", queries.correlation_intervals),
+            ("lagged correlations", queries.lag_correlations),
+            ("station pairs", queries.station_pairs),
+        ],
+    ]
+
+
+def _run(stage, index):
+    global WORKER
+    WORKER = True
+    name, function = _jobs()[stage][index]
+    start = time.perf_counter()
+    function()
+    return name, time.perf_counter() - start
+
+
+def dataset_versions():
+    return {name: data.convert(name) for name in data.DTYPES}
+
+
+def run(processes=None):
+    """Compute every result for the current dataset versions; returns the versions."""
+    current = dataset_versions()
+    stages = _jobs()
+    state = {
+        "pid": os.getpid(), "started": time.time(), "finished": None, "versions": current,
+        "total": sum(len(stage) for stage in stages), "done": [],
+    }
+    _write_status(state)
+    try:
+        with ProcessPoolExecutor(processes) as pool:
+            for stage, jobs in enumerate(stages):
+                futures = [pool.submit(_run, stage, index) for index in range(len(jobs))]
+                for future in as_completed(futures):
+                    name, seconds = future.result()
+                    state["done"].append(name)
+                    _write_status(state)
+                    print(f"{name}: {seconds:.2f} s")
+    finally:
+        state["finished"] = time.time()
+        _write_status(state)
+    return current
+
+
+def indicator():
+    """Show the worker's progress at the top of a page while it rebuilds."""
+    import streamlit as st
+
+    reset()
+    if not rebuilding():
+        return
+    current = status()
+    done, total = len(current["done"]), current["total"]
+    st.progress(
+        done / total,
+        text=f"Updating precomputed results for new data ({done}/{total}). Sections marked as outdated show the previous results until then.",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the dashboard results into the shared cache.")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="keep running, checking the data this often")
+    args = parser.parse_args(argv)
+    done = run(args.processes)
+    while args.watch:
+        time.sleep(args.watch)
+        if dataset_versions() != done:
+            done = run(args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""The dashboard computations as plain functions.
+
+Every table and chart series the pages show is computed here from the shared
+loaders, cubes, trends and correlation engine, so the same results can be
+pulled without a Streamlit session, e.g. by ``dashboard.service``. Arguments
+mirror the sidebar filters: ``years`` is an inclusive ``(first, last)`` pair
+and a ``cbsa`` or ``site`` of None means all of them; one that is not in the
+data raises ``KeyError``. Queries behind charts
+take a ``max_points`` or ``max_bars`` budget and reduce longer results with
+``dashboard.downsample``; None returns every value. Returned frames may be
+shared and must be treated as read-only.
+
+``QUERIES`` lists the queries by name with the datasets each one reads and
+how to parse its arguments from text.
+"""
+import numpy as np
+import pandas as pd
+
+from dashboard import correlation, downsample, monthly, stations, trends
+from dashboard.cube import aqi_cube, ground_water_cube, snow_cube
+from dashboard.data import AQI, GROUND_WATER, SNOW_DEPTH, load_aqi
+
+CATEGORIES = ["Good", "Moderate", "Unhealthy_for_Sensitive_Groups", "Unhealthy", "Very_Unhealthy", "Hazardous"]
+POLLUTANTS = ["#_Days_CO", "#_Days_NO2", "#_Days_O3", "#_Days_PM2.5", "#_Days_PM10"]
+AQI_STATISTICS = ["AQI_Maximum", "AQI_90th_Percentile", "AQI_Median"]
+SNOW = "Snow Depth (in)"
+WATER_LEVEL = "Static Water Level (ft)"
+LAGS = range(0, 6)
+
+
+# Air quality
+
+def filtered_aqi(years=None, cbsa=None):
+    """Rows of the AQI table within ``years`` for ``cbsa``."""
+    if cbsa:
+        index = stations.row_index(AQI, "CBSA")
+        if cbsa not in index.keys:
+            raise KeyError(cbsa)
+        frame = index.rows(cbsa)
+    else:
+        frame = load_aqi()
+    if years is not None:
+        frame = frame[(frame["Year"] >= years[0]) & (frame["Year"] <= years[1])]
+    return frame
+
+
+def aqi_filters(years=None, cbsa=None):
+    """The ``filtered_aqi`` conditions as ``dashboard.tables`` filters."""
+    filters = []
+    if years is not None:
+        filters += [("Year", ">=", years[0]), ("Year", "<=", years[1])]
+    if cbsa:
+        filters.append(("CBSA", "==", cbsa))
+    return filters
+
+
+def overall_aqi(max_points=None):
+    """Mean AQI median per year over every CBSA."""
+    return downsample.series(aqi_cube().series("AQI_Median"), max_points)
+
+
+def aqi_categories(years=None, cbsa=None):
+    """Total number of days per AQI category."""
+    cube = aqi_cube()
+    return pd.Series({col: cube.total(col, key=cbsa, years=years) for col in CATEGORIES})
+
+
+def yearly_pollutants(years=None, cbsa=None, max_bars=None):
+    """Days per year on which each pollutant was the main one, summed over year bins past ``max_bars``."""
+    return downsample.bins(aqi_cube().frame(POLLUTANTS, "sum", key=cbsa, years=years), max_bars)
+
+
+def aqi_stats(years=None, cbsa=None, max_points=None):
+    """Yearly mean of the maximum, 90th percentile and median AQI."""
+    return downsample.frame(aqi_cube().frame(AQI_STATISTICS, "mean", key=cbsa, years=years), max_points)
+
+
+def aqi_trends():
+    """Linear and Sen's trends of the yearly median AQI per CBSA."""
+    return trends.table(AQI, "AQI_Median")
+
+
+# Water resources
+
+def snow_depth(site=None, years=None, max_points=None):
+    """Yearly mean snow depth of ``site``."""
+    return downsample.series(snow_cube().series(SNOW, key=site, years=years), max_points)
+
+
+def snow_history(site=None, years=None, max_points=None):
+    """Snow depth of ``site`` at the finest resolution within ``max_points``.
+
+    Monthly readings (index ``Month``) when they fit, otherwise yearly means
+    (index ``Water Year``), reduced further if those do not fit either.
+    """
+    history = monthly.get().history(site, years)
+    if max_points is None or len(history) <= max_points:
+        return history
+    return snow_depth(site, years, max_points)
+
+
+def snow_monthly(site=None, years=None):
+    """Mean, lowest and highest snow depth of ``site`` per month over ``years``."""
+    return monthly.get().profile(site, years)
+
+
+def water_level(years=None, max_points=None):
+    """Yearly mean static water level over every groundwater system."""
+    return downsample.series(ground_water_cube().series(WATER_LEVEL, years=years), max_points)
+
+
+def snow_vs_water(site=None, years=None):
+    """Yearly snow depth of ``site`` next to the statewide static water level."""
+    return snow_depth(site, years).reset_index().merge(water_level(years).reset_index(), on="Water Year", how="inner")
+
+
+def snow_decline(limit=10, min_years=3):
+    """Snow sites with the steepest declining trend, steepest first."""
+    table = trends.table(SNOW_DEPTH, SNOW)
+    table = table[table["n_years"] >= min_years].assign(Decline=lambda t: -t["slope"])
+    return table.nlargest(limit, "Decline").rename_axis("Site").reset_index()
+
+
+def overall_water():
+    """Yearly statewide snow depth and static water level."""
+    return snow_depth().reset_index().merge(water_level().reset_index(), on="Water Year", how="inner")
+
+
+def systems_near(site, radius_km=25.0):
+    """Groundwater systems within ``radius_km`` of snow ``site``; None without coordinates."""
+    return stations.systems_near(site, radius_km)
+
+
+# Correlations
+
+def correlation_data():
+    """Yearly statewide snow depth, static water level and AQI median."""
+    aqi = aqi_cube().series("AQI_Median").reset_index().rename(columns={"Year": "Water Year"})
+    return overall_water().merge(aqi, on="Water Year", how="inner")
+
+
+def corr_matrix():
+    """Pearson correlations between the columns of ``correlation_data``."""
+    return correlation_data().drop(columns="Water Year").corr()
+
+
+def correlation_intervals():
+    """Bootstrap confidence intervals of the ``corr_matrix`` correlations."""
+    def compute():
+        variables = correlation_data().drop(columns="Water Year")
+        return pd.concat([
+            correlation.bootstrap(variables, method="pearson").assign(Method="Pearson"),
+            correlation.bootstrap(variables, method="spearman").assign(Method="Spearman"),
+        ])
+    return correlation.cached("queries.correlation_intervals", [SNOW_DEPTH, GROUND_WATER, AQI], compute)
+
+
+def _lags():
+    corr = correlation_data()
+    years = np.arange(corr["Water Year"].min() - max(LAGS), corr["Water Year"].max() + 1)
+    snow = correlation.yearly_matrix(SNOW_DEPTH, SNOW, years)
+    snow_state = correlation.yearly_matrix(SNOW_DEPTH, SNOW, years, keys=False)
+    water_state = correlation.yearly_matrix(GROUND_WATER, WATER_LEVEL, years, keys=False)
+    statewide = pd.DataFrame({
+        "Pearson": correlation.lagged(snow_state, water_state, LAGS)[0][:, 0, 0],
+        "Spearman": correlation.lagged(snow_state, water_state, LAGS, method="spearman")[0][:, 0, 0],
+    }, index=pd.Index(list(LAGS), name="Lag (years)"))
+    r, n = correlation.lagged(snow, water_state, LAGS)
+    r, n = r[:, :, 0], n[:, :, 0]
+    has_r = ~np.isnan(r).all(axis=0)
+    best = np.nanargmax(np.abs(np.where(np.isnan(r), 0, r)), axis=0)
+    sites = pd.DataFrame({
+        "Site": snow.index,
+        "Best Lag (years)": best,
+        "Correlation": r[best, np.arange(r.shape[1])],
+        "Years": n[best, np.arange(r.shape[1])],
+    })[has_r].sort_values("Correlation", key=np.abs, ascending=False)
+    return statewide, sites
+
+
+def lag_correlations():
+    """Statewide snow depth (year N) vs static water level (year N + lag) per lag."""
+    return correlation.cached("queries.lags", [SNOW_DEPTH, GROUND_WATER, AQI], _lags)[0]
+
+
+def site_lags():
+    """Per snow site, the lag with the strongest correlation to statewide water level."""
+    return correlation.cached("queries.lags", [SNOW_DEPTH, GROUND_WATER, AQI], _lags)[1]
+
+
+def station_pairs():
+    """Correlation of each snow site with its nearest groundwater system; None without coordinates."""
+    def compute():
+        pairs = stations.nearest_pairs()
+        if pairs is None or pairs.empty:
+            return pairs
+        corr = correlation_data()
+        years = np.arange(corr["Water Year"].min(), corr["Water Year"].max() + 1)
+        snow = correlation.yearly_matrix(SNOW_DEPTH, SNOW, years)
+        water = correlation.yearly_matrix(GROUND_WATER, WATER_LEVEL, years)
+        r, n = correlation.paired(snow.reindex(pairs["Site"]), water.reindex(pairs["System Name"]))
+        return pairs.assign(Correlation=r, Years=n).dropna(subset=["Correlation"]).sort_values(
+            "Correlation", key=np.abs, ascending=False
+        )
+    return correlation.cached(
+        ("queries.station_pairs", stations.registry_version()), [SNOW_DEPTH, GROUND_WATER, AQI], compute
+    )
+
+
+def year_range(text):
+    """Parse ``"1990-2000"`` or ``"1990,2000"`` into a ``(first, last)`` pair."""
+    first, last = text.replace(",", "-").split("-", 1)
+    return int(first), int(last)
+
+
+# name -> (function, datasets it reads, argument parsers)
+QUERIES = {
+    "filtered_aqi": (filtered_aqi, [AQI], {"years": year_range, "cbsa": str}),
+    "overall_aqi": (overall_aqi, [AQI], {"max_points": int}),
+    "aqi_categories": (aqi_categories, [AQI], {"years": year_range, "cbsa": str}),
+    "yearly_pollutants": (yearly_pollutants, [AQI], {"years": year_range, "cbsa": str, "max_bars": int}),
+    "aqi_stats": (aqi_stats, [AQI], {"years": year_range, "cbsa": str, "max_points": int}),
+    "aqi_trends": (aqi_trends, [AQI], {}),
+    "snow_depth": (snow_depth, [SNOW_DEPTH], {"site": str, "years": year_range, "max_points": int}),
+    "snow_history": (snow_history, [SNOW_DEPTH], {"site": str, "years": year_range, "max_points": int}),
+    "snow_monthly": (snow_monthly, [SNOW_DEPTH], {"site": str, "years": year_range}),
+    "water_level": (water_level, [GROUND_WATER], {"years": year_range, "max_points": int}),
+    "snow_vs_water": (snow_vs_water, [SNOW_DEPTH, GROUND_WATER], {"site": str, "years": year_range}),
+    "snow_decline": (snow_decline, [SNOW_DEPTH], {"limit": int, "min_years": int}),
+    "overall_water": (overall_water, [SNOW_DEPTH, GROUND_WATER], {}),
+    "correlation_data": (correlation_data, [SNOW_DEPTH, GROUND_WATER, AQI], {}),
+    "corr_matrix": (corr_matrix, [SNOW_DEPTH, GROUND_WATER, AQI], {}),
+    "correlation_intervals": (correlation_intervals, [SNOW_DEPTH, GROUND_WATER, AQI], {}),
+    "lag_correlations": (lag_correlations, [SNOW_DEPTH, GROUND_WATER, AQI], {}),
+    "site_lags": (site_lags, [SNOW_DEPTH, GROUND_WATER, AQI], {}),
+}
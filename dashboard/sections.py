@@ -0,0 +1,61 @@
+"""Page sections as independently rerunnable Streamlit fragments.
+
+A section is a function decorated with ``section(title, depends=...)`` and
+called with every sidebar input of the page::
+
+    inputs = {"years": selected_years, "cbsa": selected_cbsa}
+
+    @sections.section("AQI Days by Category", depends=("years", "cbsa"))
+    def category_days(years, cbsa):
+        ...
+
+    category_days(inputs)
+
+The function only receives the inputs it declares, and everything it reads
+through ``dashboard.queries`` and ``dashboard.charts`` is cached on those
+inputs and the dataset versions. Sections are not skipped: Streamlit clears
+every element a full rerun (a sidebar change) does not draw again, so each
+section still runs, but one whose inputs did not change finds all of its
+results in those caches. Each section runs as an ``st.fragment``, so
+interacting with it, e.g. opening a lazy section, reruns that section alone.
+
+Fragment keys and expander state need ``streamlit>=1.66``.
+
+With ``lazy=True`` the section sits in a collapsed expander titled with the
+section title and computes nothing until it is opened. A section that showed
+results of older data while ``dashboard.precompute`` rebuilds them is marked
+as outdated.
+"""
+import streamlit as st
+
+from dashboard import metrics, precompute
+
+
+def section(title, depends=(), lazy=False):
+    """Turn a function into a page section; see the module docstring."""
+    def decorator(function):
+        page = metrics.page()
+
+        def body(**inputs):
+            if metrics.page() is None:
+                # A fragment rerun starts without the page's run.
+                metrics.begin(page)
+            stale = precompute.served_stale()
+            with metrics.section(title):
+                if not lazy:
+                    function(**inputs)
+                else:
+                    expander = st.expander(title, key=f"{page}.{title}.expanded", on_change="rerun")
+                    if expander.open:
+                        with expander:
+                            function(**inputs)
+            if precompute.served_stale() > stale:
+                st.caption("Outdated: these results are from the previous data and are being recomputed.")
+
+        fragment = st.fragment(body, key=f"{page}.{title}")
+
+        def run(inputs=None):
+            inputs = inputs or {}
+            return fragment(**{name: inputs[name] for name in depends})
+        return run
+    return decorator
@@ -0,0 +1,282 @@
+"""Read-only HTTP service for the queries in ``dashboard.queries``.
+
+A small asyncio HTTP/1.1 server that needs nothing beyond the standard
+library and the dashboard's own dependencies::
+
+    python -m dashboard.service --port 8502
+
+    GET /                                      list of queries and their arguments
+    GET /aqi_stats?years=2000-2020&cbsa=...    JSON (``orient="split"``)
+    GET /aqi_stats?format=arrow                Arrow IPC stream
+    GET /metrics                               section timings and cache counters (Prometheus text)
+    GET /table/aqi?where=Year>=2000&sort=Year&desc=1&offset=0&limit=50&columns=CBSA,Year
+                                               one page of a dataset (JSON or Arrow)
+    GET /table/aqi?where=Year>=2000&format=csv full result as CSV or Parquet, streamed
+
+Queries run on a worker thread so slow ones do not block other connections.
+An unknown CBSA or site is answered with ``404 Not Found``. Each response
+carries an ``ETag`` built from the query, its arguments, the response format
+and the versions of the datasets it reads; ``If-None-Match`` with the current tag is
+answered with ``304 Not Modified`` without running the query, and encoded
+bodies are kept in a byte-capped LRU cache, configurable with
+``DASHBOARD_RESPONSE_CACHE_MB``. ``/table`` filters, sorts and pages through
+a dataset with ``dashboard.tables``; exports are sent with chunked transfer
+encoding as they are written instead of being held in memory.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from dashboard import data, metrics, precompute, queries, tables
+
+MAX_BYTES = int(float(os.environ.get("DASHBOARD_RESPONSE_CACHE_MB", "32")) * 1024 * 1024)
+ARROW = "application/vnd.apache.arrow.stream"
+JSON = "application/json"
+TABLES = {"aqi": data.AQI, "snow_depth": data.SNOW_DEPTH, "ground_water": data.GROUND_WATER}
+CONDITION = re.compile(r"^(.+?)(==|!=|<=|>=|<|>)(.*)$")
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+cache = ResponseCache()
+
+
+def _frame(result):
+    if isinstance(result, pd.Series):
+        return result.to_frame(result.name or "value")
+    return result
+
+
+def encode(result, fmt):
+    """Encode a query result as JSON (``orient="split"``) or an Arrow IPC stream."""
+    frame = _frame(result)
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(frame)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    return frame.to_json(orient="split", date_format="iso").encode()
+
+
+def etag(name, args, datasets, fmt):
+    """Return the entity tag of query ``name`` with ``args`` in ``fmt`` on the current dataset versions."""
+    digest = hashlib.sha1(repr((name, sorted(args.items()), fmt)).encode())
+    for dataset in datasets:
+        digest.update(data.dataset_version(dataset).encode())
+    return '"' + digest.hexdigest() + '"'
+
+
+def parse_args(name, params):
+    """Turn query-string ``params`` into keyword arguments for query ``name``."""
+    _, _, parsers = queries.QUERIES[name]
+    unknown = set(params) - set(parsers)
+    if unknown:
+        raise ValueError(f"unknown argument(s): {', '.join(sorted(unknown))}")
+    return {key: parsers[key](value) for key, value in params.items()}
+
+
+def table_args(pairs):
+    """Turn ``/table`` query-string ``pairs`` into ``dashboard.tables.window`` arguments."""
+    args = {"filters": [], "columns": None, "sort": None, "descending": False, "offset": 0, "limit": tables.PAGE_SIZES[0]}
+    for key, value in pairs:
+        if key == "where":
+            match = CONDITION.match(value)
+            if match is None:
+                raise ValueError(f"bad condition {value!r}; expected <column><op><value>")
+            args["filters"].append(match.groups())
+        elif key == "columns":
+            args["columns"] = value.split(",")
+        elif key == "sort":
+            args["sort"] = value
+        elif key == "desc":
+            args["descending"] = value not in ("", "0", "false")
+        elif key in ("offset", "limit"):
+            args[key] = int(value)
+        else:
+            raise ValueError(f"unknown argument {key!r}")
+    return args
+
+
+def respond_table(dataset, query, headers):
+    """Answer ``/table/<dataset>``: a page as JSON or Arrow, or a streamed CSV or Parquet export."""
+    if dataset not in TABLES:
+        return 404, {"Content-Type": JSON}, json.dumps({"error": f"unknown table {dataset!r}"}).encode()
+    pairs = parse_qsl(query)
+    fmt = dict(pairs).get("format", "arrow" if ARROW in headers.get("accept", "") else "json")
+    try:
+        args = table_args([(key, value) for key, value in pairs if key != "format"])
+    except ValueError as error:
+        return 400, {"Content-Type": JSON}, json.dumps({"error": str(error)}).encode()
+    name = TABLES[dataset]
+    referenced = [column for column, _, _ in args["filters"]] + (args["columns"] or []) + [args["sort"] or data.columns(name)[0]]
+    unknown = set(referenced) - set(data.columns(name))
+    if unknown:
+        return 400, {"Content-Type": JSON}, json.dumps({"error": f"unknown column(s): {', '.join(sorted(unknown))}"}).encode()
+    try:
+        args["filters"] = tables.typed_filters(name, args["filters"])
+    except ValueError as error:
+        return 400, {"Content-Type": JSON}, json.dumps({"error": str(error)}).encode()
+    if fmt in tables.FORMATS:
+        del args["offset"], args["limit"]
+        return 200, {"Content-Type": tables.FORMATS[fmt]}, tables.export(name, fmt, **args)
+    tag = etag(f"table/{dataset}", {"query": query}, [name], fmt)
+    response_headers = {
+        "ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept", "Content-Type": ARROW if fmt == "arrow" else JSON,
+    }
+    if tag in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+        return 304, response_headers, b""
+    frame, total = tables.window(name, **args)
+    response_headers["X-Total-Count"] = str(total)
+    return 200, response_headers, encode(frame, fmt)
+
+
+def respond(method, target, headers):
+    """Answer one request; returns ``(status, headers, body)``. Blocking.
+
+    ``body`` is bytes, or an iterator of bytes for streamed responses.
+    """
+    if method not in ("GET", "HEAD"):
+        return 405, {"Allow": "GET, HEAD"}, b""
+    url = urlsplit(target)
+    name = url.path.strip("/")
+    if name.startswith("table/"):
+        return respond_table(name[len("table/"):], url.query, headers)
+    if name == "metrics":
+        return 200, {"Content-Type": "text/plain; version=0.0.4"}, metrics.prometheus().encode()
+    if not name:
+        listing = {query: sorted(parsers) for query, (_, _, parsers) in queries.QUERIES.items()}
+        return 200, {"Content-Type": JSON}, json.dumps(listing).encode()
+    if name not in queries.QUERIES:
+        return 404, {"Content-Type": JSON}, json.dumps({"error": f"unknown query {name!r}"}).encode()
+
+    params = dict(parse_qsl(url.query))
+    fmt = params.pop("format", "arrow" if ARROW in headers.get("accept", "") else "json")
+    try:
+        args = parse_args(name, params)
+    except ValueError as error:
+        return 400, {"Content-Type": JSON}, json.dumps({"error": str(error)}).encode()
+
+    function, datasets, _ = queries.QUERIES[name]
+    tag = etag(name, args, datasets, fmt)
+    response_headers = {
+        "ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept", "Content-Type": ARROW if fmt == "arrow" else JSON,
+    }
+    if tag in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+        return 304, response_headers, b""
+    body = cache.get(tag)
+    if body is None:
+        precompute.reset()
+        try:
+            result = function(**args)
+        except KeyError as error:
+            # A CBSA or site that is not in the data.
+            return 404, {"Content-Type": JSON}, json.dumps({"error": f"not found: {error.args[0]}"}).encode()
+        body = encode(result, fmt)
+        if precompute.served_stale():
+            # Results of the previous data while the worker rebuilds: not cacheable.
+            del response_headers["ETag"]
+            response_headers["Cache-Control"] = "no-store"
+            return 200, response_headers, body
+        cache.put(tag, body)
+    return 200, response_headers, body
+
+
+async def handle(reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            try:
+                status, response_headers, body = await asyncio.to_thread(respond, method, target, headers)
+            except Exception as error:  # keep serving other requests
+                status, response_headers, body = 500, {"Content-Type": JSON}, json.dumps({"error": str(error)}).encode()
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            streamed = not isinstance(body, bytes)
+            head = [f"HTTP/1.1 {status} {REASONS[status]}"]
+            head.append("Transfer-Encoding: chunked" if streamed else f"Content-Length: {len(body)}")
+            head += [f"{key}: {value}" for key, value in response_headers.items()]
+            head.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            if streamed and method != "HEAD":
+                # Each chunk is produced on a worker thread and sent before the next is written.
+                chunks = iter(body)
+                while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                    if chunk:
+                        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        await writer.drain()
+                writer.write(b"0\r\n\r\n")
+            elif not streamed and method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8502):
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard queries as JSON or Arrow over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args(argv)
+    print(f"Serving dashboard queries on http://{args.host}:{args.port}/")
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
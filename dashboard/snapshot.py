@@ -0,0 +1,280 @@
+"""Static HTML snapshots of the dashboards.
+
+Runs the home page and every dashboard headlessly with Streamlit's
+``AppTest`` in their default state, so the same page and chart code draws
+everything, and writes the result as plain HTML with the charts as PNG files
+and the tables as JSON next to them::
+
+    python -m dashboard.snapshot -o site
+    python -m dashboard.snapshot -o site --variants variants.json --live-url https://example.org/
+
+``--variants`` names a JSON file of extra filter combinations per page,
+keyed by the sidebar widget labels::
+
+    {"pages/page1.py": [{"Select CBSA": "Albuquerque, NM", "Select Year Range": [2000, 2020]}]}
+
+Lazy sections are opened, and table widgets and download buttons are left
+out. Paginated tables are exported whole: the JSON file next to a table has
+every row, and the HTML shows the first ``HTML_ROWS`` of them. Links between
+the dashboards point to the exported files. Assets are named by content
+hash, so variants that share a chart share the file. Any static file server
+or CDN can serve the output directory.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Page script -> output file, in navigation order.
+PAGES = {
+    "app21.py": "index.html",
+    "pages/page1.py": "page1.html",
+    "pages/page2.py": "page2.html",
+    "pages/page3.py": "page3.html",
+}
+
+# Paths the home page links to in the live app -> exported file.
+LINKS = {"/app": "page1.html", "/appwater": "page2.html", "/correlation": "page3.html"}
+LINK = re.compile(r"""(href\s*=\s*)(['"])(/[^'"]*)\2""")
+
+# Rows of a table written into the HTML; the JSON file has all of them.
+HTML_ROWS = 500
+
+STYLE = """
+body { font-family: "Source Sans Pro", Arial, sans-serif; color: #31333f; margin: 0; }
+nav { background: #1b4965; padding: 12px 24px; }
+nav a { color: #fff; margin-right: 20px; text-decoration: none; }
+main { max-width: 1100px; margin: 0 auto; padding: 24px; }
+img { width: 100%; }
+table.dataframe { border-collapse: collapse; font-size: 14px; margin: 8px 0; }
+table.dataframe th, table.dataframe td { border: 1px solid #e6e9ef; padding: 4px 8px; text-align: right; }
+.caption, footer { color: #808495; font-size: 14px; }
+.alert { padding: 12px 16px; border-radius: 6px; background: #fff8e1; margin: 8px 0; }
+.columns { display: flex; gap: 16px; }
+.columns > div { flex: 1; }
+details { margin: 12px 0; border: 1px solid #e6e9ef; border-radius: 6px; padding: 8px 16px; }
+summary { cursor: pointer; font-weight: 600; }
+"""
+
+_INLINE = [
+    (re.compile(r"\*\*(.+?)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"(?<![\w*])\*(?!\s)(.+?)\*(?!\w)"), r"<em>\1</em>"),
+    (re.compile(r"`(.+?)`"), r"<code>\1</code>"),
+    (re.compile(r"\[(.+?)\]\((.+?)\)"), r'<a href="\2">\1</a>'),
+]
+
+
+def _inline(text):
+    text = html.escape(text, quote=False)
+    for pattern, replacement in _INLINE:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def relink(text):
+    """``text`` with links to the live app's pages pointing to the exported files."""
+    return LINK.sub(lambda match: match.group(1) + match.group(2) + LINKS.get(match.group(3), match.group(3)) + match.group(2), text)
+
+
+def markdown(text, allow_html=False):
+    """Convert the small subset of Markdown the pages use into HTML."""
+    if allow_html:
+        return relink(text)
+    blocks, items = [], []
+    for line in text.strip().splitlines() + [""]:
+        line = line.strip()
+        bullet = re.match(r"^[-*] (.*)", line)
+        if bullet:
+            items.append(f"<li>{_inline(bullet.group(1))}</li>")
+            continue
+        if items:
+            blocks.append("<ul>" + "".join(items) + "</ul>")
+            items = []
+        heading = re.match(r"^(#{1,6}) (.*)", line)
+        if heading:
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif line:
+            blocks.append(f"<p>{_inline(line)}</p>")
+    return "\n".join(blocks)
+
+
+class Assets:
+    """Files written next to the pages, named by content hash."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "assets"), exist_ok=True)
+
+    def write(self, content, extension):
+        name = f"assets/{hashlib.sha1(content).hexdigest()[:16]}.{extension}"
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as handle:
+                handle.write(content)
+        return name
+
+
+def _render(node, assets, media):
+    """HTML of an ``AppTest`` element tree node."""
+    kind = type(node).__name__
+    children = getattr(node, "children", None)
+    if kind == "Expander":
+        inner = "".join(_render(child, assets, media) for child in children.values())
+        return f"<details open><summary>{html.escape(node.label)}</summary>{inner}</details>"
+    if children is not None:
+        inner = "".join(_render(child, assets, media) for child in children.values())
+        if not inner:
+            return ""
+        if any(type(child).__name__ == "Column" for child in children.values()):
+            return f'<div class="columns">{inner}</div>'
+        return f"<div>{inner}</div>"
+    if kind == "Title":
+        return f"<h1>{_inline(node.value)}</h1>"
+    if kind == "Header":
+        return f"<h2>{_inline(node.value)}</h2>"
+    if kind == "Subheader":
+        return f"<h3>{_inline(node.value)}</h3>"
+    if kind == "Markdown":
+        return markdown(node.value, node.proto.allow_html)
+    if kind == "Caption":
+        return f'<p class="caption">{_inline(node.value)}</p>'
+    if kind in ("Warning", "Info", "Error", "Success", "Exception"):
+        return f'<div class="alert {kind.lower()}">{markdown(str(node.value))}</div>'
+    if kind in ("Dataframe", "Table"):
+        frame = node.value
+        source = assets.write(frame.to_json(orient="split", date_format="iso").encode(), "json")
+        table = frame.head(HTML_ROWS).to_html(classes="dataframe", border=0, na_rep="", float_format=lambda value: f"{value:,.2f}")
+        if len(frame) > HTML_ROWS:
+            return f'{table}<p class="caption">First {HTML_ROWS:,} of {len(frame):,} rows. <a href="{source}">All rows (JSON)</a></p>'
+        return f'{table}<p class="caption"><a href="{source}">Data (JSON)</a></p>'
+    if kind == "Image":
+        images = []
+        for image in node.proto.imgs:
+            content = media.get(os.path.splitext(os.path.basename(image.url))[0])
+            if content is not None:
+                images.append(f'<img src="{assets.write(content[0], content[1])}" alt="{html.escape(image.caption)}">')
+        return "".join(images)
+    # Widgets and download buttons need the live app.
+    return ""
+
+
+def _apply(at, values):
+    """Set the sidebar widgets labelled like the keys of ``values``."""
+    widgets = {widget.label: widget for kind in ("slider", "selectbox", "multiselect") for widget in getattr(at.sidebar, kind)}
+    for label, value in values.items():
+        if label not in widgets:
+            raise KeyError(f"no sidebar widget labelled {label!r}")
+        widgets[label].set_value(tuple(value) if isinstance(value, list) else value)
+
+
+def capture(page, values=None):
+    """Run ``page`` with the sidebar ``values`` and its lazy sections open.
+
+    Returns ``(title, main, media, filters)``: the page title, its main
+    element tree, the media files it emitted by id and the sidebar values.
+    """
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import AppTest
+
+    media = {}
+    load_and_get_id = MemoryMediaFileStorage.load_and_get_id
+
+    def recorded_load_and_get_id(self, path_or_data, mimetype, *args, **kwargs):
+        file_id = load_and_get_id(self, path_or_data, mimetype, *args, **kwargs)
+        if isinstance(path_or_data, bytes):
+            media[file_id] = (path_or_data, mimetype.split("/")[-1].split("+")[0])
+        return file_id
+
+    MemoryMediaFileStorage.load_and_get_id = recorded_load_and_get_id
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=600).run()
+        if values:
+            _apply(at, values)
+        for key in at.session_state.keys():
+            if key.endswith(".expanded"):
+                at.session_state[key] = True
+        at.run()
+    finally:
+        MemoryMediaFileStorage.load_and_get_id = load_and_get_id
+    if at.exception:
+        raise RuntimeError(f"{page}: {at.exception[0].value}")
+    titles = [element.value for element in at.title]
+    filters = {
+        widget.label: widget.value
+        for kind in ("slider", "selectbox", "multiselect") for widget in getattr(at.sidebar, kind)
+    }
+    return (titles[0] if titles else page), at.main, media, filters
+
+
+def _slug(values):
+    text = "-".join(str(value) for value in values.values())
+    return re.sub(r"[^A-Za-z0-9]+", "-", text).strip("-").lower()[:60]
+
+
+def _document(title, body, navigation, footer):
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\"><title>{html.escape(title)}</title>"
+        f"<style>{STYLE}</style></head><body><nav>{navigation}</nav><main>{body}</main>"
+        f"<footer><main>{footer}</main></footer></body></html>\n"
+    )
+
+
+def build(directory, variants=None, live_url=None):
+    """Write the snapshot site to ``directory``; returns the written page files."""
+    from dashboard import charts, data, tables
+
+    # Snapshots are images; the Vega-Lite backend needs the live app.
+    charts.BACKEND = "matplotlib"
+    # There is no paging without the live app, so tables are exported whole.
+    tables.SHOW_ALL = True
+    assets = Assets(directory)
+    versions = ", ".join(f"{name} {data.dataset_version(name)[:8]}" for name in data.DTYPES)
+    runs = [(page, output, None) for page, output in PAGES.items()]
+    for page, combinations in (variants or {}).items():
+        for values in combinations:
+            runs.append((page, PAGES[page].replace(".html", f"--{_slug(values)}.html"), values))
+
+    captured = [(output, values) + capture(page, values) for page, output, values in runs]
+    navigation = "".join(
+        f'<a href="{output}">{html.escape(title)}</a>' for output, values, title, *_ in captured if values is None
+    )
+    written = []
+    for output, values, title, main, media, filters in captured:
+        body = _render(main, assets, media)
+        if filters:
+            shown = "; ".join(f"{label}: {value}" for label, value in filters.items())
+            body = f'<p class="caption">{"Filters" if values else "Default view"} — {html.escape(shown)}</p>' + body
+        footer = f"Snapshot of {time.strftime('%Y-%m-%d %H:%M')} ({html.escape(versions)})."
+        if live_url:
+            footer += f' <a href="{html.escape(live_url)}">Open the live dashboard</a> for other filters.'
+        with open(os.path.join(directory, output), "w", encoding="utf-8") as handle:
+            handle.write(_document(title, body, navigation, footer))
+        written.append(output)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the dashboards into static HTML.")
+    parser.add_argument("-o", "--output", default="site", help="output directory (default %(default)s)")
+    parser.add_argument("--variants", help="JSON file of extra filter combinations per page")
+    parser.add_argument("--live-url", help="URL of the live app, linked from every page")
+    args = parser.parse_args(argv)
+    sys.path.insert(0, ROOT)
+    variants = None
+    if args.variants:
+        with open(args.variants) as handle:
+            variants = json.load(handle)
+    for output in build(args.output, variants, args.live_url):
+        print(os.path.join(args.output, output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Station registry and lookup indexes for the snow and groundwater datasets.
+
+``RowIndex`` groups a dataset's rows by a key column once (Site, Station,
+System Name, ...), so fetching one key's rows is a hash lookup and a slice
+instead of a boolean-mask scan over the whole frame.
+
+Coordinates are not part of the survey CSVs. They come from an optional
+registry file, ``data/station_coordinates.csv``, with the columns::
+
+    Dataset,Name,Latitude,Longitude
+    snow,Alamitos,35.87,-105.80
+    ground water,RIO LUCIO MDWCA,36.10,-105.68
+
+where ``Dataset`` is ``snow`` (``Name`` is a snow ``Site``) or
+``ground water`` (``Name`` is a ``System Name``). ``GridIndex`` buckets those
+points into a latitude/longitude grid for nearest-neighbour and radius
+queries that only look at nearby cells.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dashboard import data
+
+COORDINATES = "station_coordinates.csv"
+EARTH_RADIUS_KM = 6371.0
+SNOW = "snow"
+GROUND_WATER = "ground water"
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres; arguments broadcast."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class RowIndex:
+    def __init__(self, frame, key_col):
+        keys = frame[key_col]
+        if not isinstance(keys.dtype, pd.CategoricalDtype):
+            keys = keys.astype("category")
+        codes = keys.cat.codes.to_numpy()
+        self.frame = frame
+        self.keys = pd.Index(keys.cat.categories)
+        self.order = np.argsort(codes, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(self.keys)))])
+
+    def rows(self, key):
+        """Return the rows for ``key`` (empty if unknown), in file order."""
+        position = self.keys.get_indexer([key])[0]
+        if position < 0:
+            return self.frame.iloc[:0]
+        return self.frame.iloc[self.order[self.offsets[position]:self.offsets[position + 1]]]
+
+
+class GridIndex:
+    def __init__(self, names, lat, lon, cell_deg=0.25):
+        self.names = pd.Index(names)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.cell_deg = cell_deg
+        cells = pd.DataFrame({"i": self._cell(self.lat), "j": self._cell(self.lon)})
+        self.cells = {key: group.to_numpy() for key, group in cells.groupby(["i", "j"]).groups.items()}
+
+    def _cell(self, value):
+        return np.floor(np.asarray(value) / self.cell_deg).astype(int)
+
+    def _candidates(self, lat, lon, ring):
+        i, j = int(self._cell(lat)), int(self._cell(lon))
+        found = [
+            self.cells[(a, b)]
+            for a in range(i - ring, i + ring + 1)
+            for b in range(j - ring, j + ring + 1)
+            if (a, b) in self.cells
+        ]
+        return np.concatenate(found) if found else np.array([], dtype=int)
+
+    def _ring_for(self, lat, radius_km):
+        # Degrees of longitude shrink towards the poles.
+        km_per_cell = self.cell_deg * np.pi / 180 * EARTH_RADIUS_KM * max(np.cos(np.radians(abs(lat) + self.cell_deg)), 0.05)
+        return int(np.ceil(radius_km / km_per_cell))
+
+    def within(self, lat, lon, radius_km):
+        """Return ``(names, distances)`` of points within ``radius_km``, nearest first."""
+        candidates = self._candidates(lat, lon, self._ring_for(lat, radius_km))
+        distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+        keep = distances <= radius_km
+        order = np.argsort(distances[keep])
+        return self.names[candidates[keep][order]], distances[keep][order]
+
+    def nearest(self, lat, lon, max_km=np.inf):
+        """Return ``(name, distance)`` of the nearest point, or ``(None, inf)``."""
+        if not len(self.lat):
+            return None, np.inf
+        ring = 0
+        max_ring = self._ring_for(lat, max_km) if np.isfinite(max_km) else None
+        while True:
+            candidates = self._candidates(lat, lon, ring)
+            if len(candidates):
+                distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+                best = np.argmin(distances)
+                # A closer point may still sit in a cell outside this ring.
+                ring_km = ring * self.cell_deg * np.pi / 180 * EARTH_RADIUS_KM * np.cos(np.radians(min(abs(lat) + ring * self.cell_deg, 89)))
+                if distances[best] <= ring_km or len(candidates) == len(self.lat):
+                    if distances[best] > max_km:
+                        return None, np.inf
+                    return self.names[candidates[best]], distances[best]
+            if max_ring is not None and ring > max_ring or ring * self.cell_deg > 360:
+                return None, np.inf
+            ring += 1
+
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _cached(key, version, build):
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    value = build()
+    with _lock:
+        _cache[key] = (version, value)
+    return value
+
+
+def row_index(name, key_col):
+    """Return the ``RowIndex`` of dataset ``name`` by ``key_col`` for its current version."""
+    return _cached(("rows", name, key_col), data.dataset_version(name), lambda: RowIndex(data.load(name), key_col))
+
+
+def registry_version():
+    """Return the modification time of the coordinate registry, or None if there is none."""
+    try:
+        return os.stat(data.dataset_path(COORDINATES)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def registry():
+    """Return the station coordinate registry, or None if there is none."""
+    version = registry_version()
+    if version is None:
+        return None
+    return _cached(
+        ("registry",), version,
+        lambda: pd.read_csv(data.dataset_path(COORDINATES)).dropna(subset=["Latitude", "Longitude"]),
+    )
+
+
+def grid(dataset):
+    """Return the ``GridIndex`` of the ``snow`` or ``ground water`` stations, or None."""
+    stations = registry()
+    if stations is None:
+        return None
+    stations = stations[stations["Dataset"] == dataset]
+    return _cached(
+        ("grid", dataset), registry_version(),
+        lambda: GridIndex(stations["Name"], stations["Latitude"], stations["Longitude"]),
+    )
+
+
+def nearest_pairs(max_km=50.0):
+    """Pair every snow site with its nearest groundwater system within ``max_km``.
+
+    Returns a frame with ``Site``, ``System Name`` and ``Distance (km)``, or
+    None when there is no coordinate registry.
+    """
+    stations = registry()
+    if stations is None:
+        return None
+    wells = grid(GROUND_WATER)
+    sites = stations[stations["Dataset"] == SNOW]
+    pairs = []
+    for site, lat, lon in zip(sites["Name"], sites["Latitude"], sites["Longitude"]):
+        system, distance = wells.nearest(lat, lon, max_km)
+        if system is not None:
+            pairs.append({"Site": site, "System Name": system, "Distance (km)": distance})
+    return pd.DataFrame(pairs, columns=["Site", "System Name", "Distance (km)"])
+
+
+def systems_near(site, radius_km=25.0):
+    """Return the groundwater systems within ``radius_km`` of snow ``site``.
+
+    Returns a frame with ``System Name`` and ``Distance (km)``, nearest first,
+    or None when there is no coordinate registry or the site has no coordinates.
+    """
+    stations = registry()
+    if stations is None:
+        return None
+    match = stations[(stations["Dataset"] == SNOW) & (stations["Name"] == site)]
+    if match.empty:
+        return None
+    names, distances = grid(GROUND_WATER).within(match["Latitude"].iloc[0], match["Longitude"].iloc[0], radius_km)
+    return pd.DataFrame({"System Name": names, "Distance (km)": distances})
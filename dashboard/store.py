@@ -0,0 +1,85 @@
+"""Typed columnar copies of the CSV files in ``data/``.
+
+Each CSV is converted once into an uncompressed Arrow IPC (Feather v2) file in
+``STORE_DIR``, tagged with the content hash of the CSV it came from. Reads
+memory-map that file and materialise only the requested columns, so a chart
+that needs two columns never touches the rest of the table.
+
+Run ``python -m dashboard.store`` to convert every dataset ahead of time.
+"""
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+STORE_DIR = os.environ.get(
+    "DASHBOARD_STORE_DIR",
+    os.path.join(
+        os.environ.get("DASHBOARD_DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))),
+        ".store",
+    ),
+)
+
+_VERSION_KEY = b"source_sha1"
+
+
+def store_path(name, part=None):
+    base = os.path.splitext(name)[0]
+    return os.path.join(STORE_DIR, base + (f".{part}" if part else "") + ".arrow")
+
+
+def stored_version(name):
+    """Return the CSV hash the stored copy of ``name`` was built from, or None."""
+    try:
+        schema = feather.read_table(store_path(name), columns=[], memory_map=True).schema
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    return (schema.metadata or {}).get(_VERSION_KEY, b"").decode() or None
+
+
+def columns(name):
+    """Return the column names of the stored copy of ``name``."""
+    return feather.read_table(store_path(name), columns=[], memory_map=True).schema.names
+
+
+def write(name, frame, version, part=None):
+    """Write ``frame`` as the stored copy of ``name`` built from CSV ``version``.
+
+    ``part`` stores a side table of the dataset, such as its rejected rows,
+    next to the main copy.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_VERSION_KEY] = version.encode()
+    table = table.replace_schema_metadata(metadata)
+    path = store_path(name, part)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read_table(name, columns=None, part=None):
+    """Memory-map the stored copy of ``name`` and return ``columns`` as an Arrow table."""
+    return feather.read_table(store_path(name, part), columns=columns, memory_map=True)
+
+
+def read(name, columns=None, part=None):
+    """Memory-map the stored copy of ``name`` and return ``columns`` as a frame."""
+    return read_table(name, columns, part).to_pandas()
+
+
+def main():
+    from dashboard import data
+
+    for name in data.DTYPES:
+        data.convert(name)
+        rejected = data.rejected(name)
+        print(f"{name} -> {store_path(name)} ({len(rejected)} rows rejected)")
+        for problems, count in rejected["Problems"].value_counts().items():
+            print(f"  {count} rows with bad {problems}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Server-side paginated tables.
+
+``show(key, source, filters)`` replaces ``st.dataframe(frame)`` for tables
+that can grow with the data. Filtering, sorting and column projection run on
+the Arrow table of ``source`` and only the visible page of rows is converted
+to pandas and sent to the browser::
+
+    tables.show("page1.summary", AQI, filters=[("Year", ">=", 2000), ("CBSA", "==", "Boise City, ID")])
+
+``source`` is either a dataset name, read memory-mapped from its columnar
+copy (see ``dashboard.data.table``), or an already computed frame.
+``filters`` are ``(column, op, value)`` conditions that must all hold, with
+``op`` one of ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=`` or ``in``.
+
+For dataset sources, the sorted row order of each (filters, sort) pair is
+cached per dataset version, so paging through a result only takes rows.
+``export`` streams the full result as CSV or Parquet in chunks of
+``EXPORT_ROWS`` rows; the tables' download buttons and
+``dashboard.service`` use it.
+"""
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from dashboard import data, metrics
+
+PAGE_SIZES = [25, 50, 100, 500]
+EXPORT_ROWS = 65_536
+MAX_ORDERS = 32
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Set by dashboard.snapshot: ``show`` draws the whole result, without paging widgets.
+SHOW_ALL = False
+
+_OPS = {
+    "==": pc.equal,
+    "!=": pc.not_equal,
+    "<": pc.less,
+    "<=": pc.less_equal,
+    ">": pc.greater,
+    ">=": pc.greater_equal,
+}
+
+_lock = threading.Lock()
+_orders = OrderedDict()  # (dataset, version, filters, sort, descending) -> (rows, table)
+
+
+def _value_type(arrow_type):
+    return arrow_type.value_type if pa.types.is_dictionary(arrow_type) else arrow_type
+
+
+def _scalar(value, arrow_type):
+    """``value`` as a scalar of ``arrow_type``; text from a URL is cast to numbers."""
+    return pa.scalar(value).cast(_value_type(arrow_type))
+
+
+def typed_filters(source, filters):
+    """``filters`` with their values cast to the column types of dataset ``source``.
+
+    Raises ValueError for a value that does not fit its column, such as text
+    compared with a number, or an unknown operator.
+    """
+    schema = data.table(source).schema
+    typed = []
+    for column, op, value in filters:
+        if op != "in" and op not in _OPS:
+            raise ValueError(f"unknown filter operator {op!r}")
+        arrow_type = schema.field(column).type
+        try:
+            if op == "in":
+                value = tuple(_scalar(v, arrow_type).as_py() for v in value)
+            else:
+                value = _scalar(value, arrow_type).as_py()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as error:
+            raise ValueError(f"bad value {value!r} for column {column!r}") from error
+        typed.append((column, op, value))
+    return typed
+
+
+def _mask(table, filters):
+    mask = None
+    for column, op, value in filters:
+        values = table.column(column)
+        if op == "in":
+            condition = pc.is_in(values, value_set=pa.array([_scalar(v, values.type).as_py() for v in value]))
+        elif op in _OPS:
+            condition = _OPS[op](values, _scalar(value, values.type))
+        else:
+            raise ValueError(f"unknown filter operator {op!r}")
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return mask
+
+
+def _order(table, filters, sort, descending):
+    """Row numbers of ``table`` matching ``filters``, in ``sort`` order."""
+    mask = _mask(table, filters)
+    rows = pa.array(np.arange(table.num_rows, dtype=np.int64))
+    if mask is not None:
+        rows = pc.filter(rows, pc.fill_null(mask, False))
+    if sort is not None:
+        key = table.column(sort)
+        if pa.types.is_dictionary(key.type):
+            # Dictionary columns are ordered by their values, not their codes.
+            key = key.cast(key.type.value_type)
+        key = pc.take(key, rows)
+        positions = pc.sort_indices(key, sort_keys=[("", "descending" if descending else "ascending")])
+        rows = pc.take(rows, positions)
+    return rows
+
+
+def _frame_table(frame):
+    return pa.Table.from_pandas(frame.reset_index(drop=True), preserve_index=False)
+
+
+def resolve(source, filters=(), sort=None, descending=False):
+    """Return ``(table, rows)``: the source table and its matching row numbers in order."""
+    filters = tuple((column, op, tuple(value) if op == "in" else value) for column, op, value in filters)
+    if isinstance(source, pd.DataFrame):
+        table = _frame_table(source)
+        return table, _order(table, filters, sort, descending)
+    key = (source, data.dataset_version(source), filters, sort, descending)
+    with _lock:
+        cached = _orders.get(key)
+        if cached is not None:
+            _orders.move_to_end(key)
+    metrics.count("tables", cached is not None)
+    if cached is not None:
+        return cached[1], cached[0]
+    table = data.table(source)
+    rows = _order(table, filters, sort, descending)
+    with _lock:
+        _orders[key] = (rows, table)
+        while len(_orders) > MAX_ORDERS:
+            _orders.popitem(last=False)
+    return table, rows
+
+
+def window(source, columns=None, filters=(), sort=None, descending=False, offset=0, limit=PAGE_SIZES[0]):
+    """Return ``(frame, total)``: ``limit`` matching rows from ``offset`` and the number of matches."""
+    table, rows = resolve(source, filters, sort, descending)
+    if columns is not None:
+        table = table.select(list(columns))
+    page = table.take(rows[offset:offset + limit])
+    return page.to_pandas(), len(rows)
+
+
+def export(source, fmt="csv", columns=None, filters=(), sort=None, descending=False):
+    """Yield the whole matching result as CSV or Parquet, ``EXPORT_ROWS`` rows at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    table, rows = resolve(source, filters, sort, descending)
+    if columns is not None:
+        table = table.select(list(columns))
+    schema = table.schema
+    if fmt == "csv":
+        # The CSV writer takes plain values, not dictionary codes; chunks are decoded one at a time.
+        schema = pa.schema([field.with_type(_value_type(field.type)) for field in schema])
+    sink = io.BytesIO()
+    writer = pa_csv.CSVWriter(sink, schema) if fmt == "csv" else pq.ParquetWriter(sink, schema)
+    for start in range(0, max(len(rows), 1), EXPORT_ROWS):
+        writer.write_table(table.take(rows[start:start + EXPORT_ROWS]).cast(schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+def show(key, source, filters=(), columns=None, file_name="table"):
+    """Show a paginated, sortable table of ``source`` with CSV and Parquet downloads.
+
+    Widget state is kept under ``key``; call it inside a section so paging
+    reruns only that section.
+    """
+    import streamlit as st
+
+    names = list(columns) if columns is not None else (
+        list(source.columns) if isinstance(source, pd.DataFrame) else data.columns(source)
+    )
+    if SHOW_ALL:
+        _, rows = resolve(source, filters)
+        frame, total = window(source, names, filters, limit=len(rows))
+        st.dataframe(frame, hide_index=True)
+        st.caption(f"All {total:,} rows")
+        return
+    sort_col, order_col, size_col, page_col = st.columns([3, 2, 2, 2])
+    sort = sort_col.selectbox("Sort by", names, index=None, placeholder="File order", key=f"{key}.sort")
+    descending = order_col.selectbox("Order", ["Ascending", "Descending"], key=f"{key}.order") == "Descending"
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, key=f"{key}.size")
+    shown = st.multiselect("Columns", names, default=names, key=f"{key}.columns") or names
+
+    _, rows = resolve(source, filters, sort, descending)
+    total = len(rows)
+    pages = max(1, math.ceil(total / page_size))
+    if st.session_state.get(f"{key}.page", 1) > pages:
+        st.session_state[f"{key}.page"] = pages
+    page = page_col.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}.page")
+
+    offset = (page - 1) * page_size
+    frame, _ = window(source, shown, filters, sort, descending, offset, page_size)
+    st.dataframe(frame, hide_index=True)
+    st.caption(f"Rows {min(offset + 1, total):,}–{offset + len(frame):,} of {total:,}")
+
+    csv_col, parquet_col = st.columns(2)
+    for column, fmt in ((csv_col, "csv"), (parquet_col, "parquet")):
+        column.download_button(
+            f"Download {fmt.upper()}",
+            data=lambda fmt=fmt: b"".join(export(source, fmt, shown, filters, sort, descending)),
+            file_name=f"{file_name}.{fmt}",
+            mime=FORMATS[fmt],
+            on_click="ignore",
+            key=f"{key}.{fmt}",
+        )
@@ -0,0 +1,124 @@
+"""Linear trends of yearly means for every key of an aggregate cube at once.
+
+``Trends`` takes the key x year matrix of yearly means out of a ``Cube`` (one
+row per Site, CBSA, ... plus the "all keys" row) and keeps prefix sums of the
+least-squares moments along the year axis. An OLS fit for any key and year
+range is then a handful of lookups, and ``table`` fits every key in one
+vectorized pass, adding Sen's slope (the median of all pairwise slopes).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dashboard import cube as cubes
+from dashboard import data, metrics, precompute
+
+# Upper bound on the pairwise-slope block held in memory by Sen's slope.
+SEN_BLOCK = 4_000_000
+
+
+class Trends:
+    def __init__(self, cube, measure):
+        self.measure = measure
+        self.keys = cube.keys
+        self.years = cube.years
+        m = cube.measures.index(measure)
+        with np.errstate(all="ignore"):
+            self.means = cube.sum[m] / cube.count[m]
+
+        # Years are measured from the first cube year to keep the moments small.
+        x = (self.years - self.years[0]).astype(float)
+        valid = ~np.isnan(self.means)
+        y = np.where(valid, self.means, 0.0)
+        w = valid.astype(float)
+        moments = np.stack([w, w * x, y, x * y * w, w * x * x, y * y])
+        self.prefix = np.pad(np.cumsum(moments, axis=2), ((0, 0), (0, 0), (1, 0)))
+
+    def _year_bounds(self, years):
+        if years is None:
+            return 0, len(self.years)
+        lo = int(np.clip(years[0] - self.years[0], 0, len(self.years)))
+        hi = int(np.clip(years[1] - self.years[0] + 1, 0, len(self.years)))
+        return lo, max(lo, hi)
+
+    def _ols(self, rows, years):
+        lo, hi = self._year_bounds(years)
+        n, sx, sy, sxy, sxx, syy = self.prefix[:, rows, hi] - self.prefix[:, rows, lo]
+        with np.errstate(all="ignore"):
+            cov = sxy - sx * sy / n
+            var_x = sxx - sx * sx / n
+            var_y = syy - sy * sy / n
+            slope = np.where(var_x > 0, cov / var_x, np.nan)
+            intercept = (sy - slope * sx) / n - slope * self.years[0]
+            sse = np.clip(var_y - slope * cov, 0, None)
+            r2 = np.where(var_y > 0, 1 - sse / var_y, np.nan)
+            stderr = np.where(n > 2, np.sqrt(sse / (n - 2) / var_x), np.nan)
+        return {"slope": slope, "intercept": intercept, "r2": r2, "stderr": stderr, "n_years": n.astype(int)}
+
+    def fit(self, key=None, years=None):
+        """Return the OLS fit of one key (or all keys) over a year range.
+
+        The result holds ``slope`` and ``intercept`` (in data units per year
+        and at year 0, like ``np.polyfit``), ``r2``, ``stderr`` of the slope
+        and ``n_years``.
+        """
+        row = len(self.keys) if key is None else self.keys.get_loc(key)
+        return {name: value.item() for name, value in self._ols(np.array([row]), years).items()}
+
+    def sens_slopes(self, years=None):
+        """Return Sen's slope per key (all keys row last) over a year range."""
+        lo, hi = self._year_bounds(years)
+        means, x = self.means[:, lo:hi], self.years[lo:hi].astype(float)
+        i, j = np.triu_indices(len(x), k=1)
+        dx = x[j] - x[i]
+        slopes = np.full(len(means), np.nan)
+        block = max(1, SEN_BLOCK // max(1, len(i)))
+        for start in range(0, len(means), block):
+            part = means[start:start + block]
+            with np.errstate(all="ignore"):
+                pairs = (part[:, j] - part[:, i]) / dx
+            has_pair = (~np.isnan(pairs)).any(axis=1)
+            slopes[start:start + block][has_pair] = np.nanmedian(pairs[has_pair], axis=1)
+        return slopes
+
+    def table(self, years=None):
+        """Return the fit of every key over a year range as a frame indexed by key."""
+        rows = np.arange(len(self.keys))
+        frame = pd.DataFrame(self._ols(rows, years), index=self.keys)
+        frame["sens_slope"] = self.sens_slopes(years)[:-1]
+        return frame[frame["n_years"] > 0]
+
+
+_lock = threading.Lock()
+_cache = {}  # (name, measure) -> (dataset version, Trends, full-range table)
+
+
+def _entry(name, measure):
+    version = data.dataset_version(name)
+    with _lock:
+        cached = _cache.get((name, measure))
+        metrics.count("trends", cached is not None and cached[0] == version)
+        if cached is not None and cached[0] == version:
+            return cached
+
+    def build():
+        with metrics.section("trends"):
+            trends = Trends(cubes.get(name), measure)
+            return version, trends, trends.table()
+
+    cached, fresh = precompute.lookup(("trends", name, measure), (version,), build)
+    if fresh:
+        with _lock:
+            _cache[(name, measure)] = cached
+    return cached
+
+
+def get(name, measure):
+    """Return the ``Trends`` of ``measure`` in dataset ``name`` for its current version."""
+    return _entry(name, measure)[1]
+
+
+def table(name, measure):
+    """Return the cached full-range trend table of ``measure`` in dataset ``name``."""
+    return _entry(name, measure)[2]
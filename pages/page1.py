@@ -1,23 +1,21 @@
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
-import os
+from dashboard import charts, downsample, metrics, precompute, queries, sections, tables
+from dashboard.data import AQI, columns, load_aqi
 
-# File path for the dataset (for unified dashboard)
-current_dir = os.path.dirname(__file__)
-file_path = os.path.join(current_dir, "..", "data", "aqi_combined_1980_2024.csv")
-file_path = os.path.abspath(file_path)
+metrics.begin("page1")
+precompute.indicator()
 
-# Load the dataset
+# Load the filter columns (parsed once per process and shared across sessions);
+# the sections below read only the columns they plot
 try:
-    data = pd.read_csv(file_path)
+    with metrics.section("load"):
+        available_columns = columns(AQI)
+        data = load_aqi([col for col in ("Year", "CBSA") if col in available_columns])
 except FileNotFoundError:
     st.error("Dataset not found. Please ensure the file is in the correct path: 'data/aqi_combined_1980_2024.csv'")
     st.stop()
 
-# Ensure required columns exist
-available_columns = data.columns
-
 # Sidebar options
 st.sidebar.header("Dashboard Options")
 
@@ -41,94 +39,135 @@ else:
     st.warning("The 'CBSA' column is missing in the dataset.")
     selected_cbsa = None
 
-# Filter data based on selections
-filtered_data = data[(data["Year"] >= selected_years[0]) & (data["Year"] <= selected_years[1])]
-if selected_cbsa:
-    filtered_data = filtered_data[filtered_data["CBSA"] == selected_cbsa]
+# Sidebar inputs the sections below depend on
+inputs = {"selected_years": selected_years, "selected_cbsa": selected_cbsa}
 
 # Display header
 st.title("Air Quality Viewer Dashboard")
 
 # Section 1: Overall AQI Trends
-st.subheader("Overall Air Quality Trends (1980–2024)")
-if "AQI_Median" in available_columns:
-    overall_aqi = data.groupby("Year")["AQI_Median"].mean()
-    if not overall_aqi.empty:
-        plt.figure(figsize=(10, 6))
-        overall_aqi.plot(marker='o', color='blue')
-        plt.title("Overall AQI Trends")
-        plt.xlabel("Year")
-        plt.ylabel("Average AQI Median")
-        plt.grid(True)
-        st.pyplot(plt)
-        plt.clf()
-        st.markdown("**Interpretation:** This trend shows changes in air quality over time. A downward slope suggests improvements in air quality.")
+@sections.section("Overall AQI Trends")
+def overall_trends():
+    st.subheader("Overall Air Quality Trends (1980–2024)")
+    if "AQI_Median" in available_columns:
+        overall_aqi = queries.overall_aqi(max_points=downsample.MAX_POINTS)
+        if not overall_aqi.empty:
+            def draw_overall_aqi(fig):
+                ax = fig.subplots()
+                overall_aqi.plot(ax=ax, marker='o', color='blue')
+                ax.set_title("Overall AQI Trends")
+                ax.set_xlabel("Year")
+                ax.set_ylabel("Average AQI Median")
+                ax.grid(True)
+            charts.show(
+                "page1.overall_aqi", draw_overall_aqi,
+                spec=lambda: charts.line(overall_aqi, "Overall AQI Trends", "Year", "Average AQI Median"),
+                datasets=[AQI]
+            )
+            st.markdown("**Interpretation:** This trend shows changes in air quality over time. A downward slope suggests improvements in air quality.")
+        else:
+            st.warning("No data available for AQI trends.")
     else:
-        st.warning("No data available for AQI trends.")
-else:
-    st.warning("'AQI_Median' column not found.")
+        st.warning("'AQI_Median' column not found.")
+overall_trends(inputs)
 
 # Section 2: AQI Days by Category
-categories = ["Good", "Moderate", "Unhealthy_for_Sensitive_Groups", "Unhealthy", "Very_Unhealthy", "Hazardous"]
-if all(col in available_columns for col in categories):
-    st.subheader("AQI Days by Category")
-    category_sums = filtered_data[categories].sum()
-    category_sums = pd.to_numeric(category_sums, errors="coerce").fillna(0)
-    if not category_sums.empty:
-        plt.figure(figsize=(8, 6))
-        plt.bar(category_sums.index, category_sums.values, color='skyblue')
-        plt.title("AQI Days by Category")
-        plt.xlabel("Category")
-        plt.ylabel("Number of Days")
-        plt.grid(axis="y")
-        for i, val in enumerate(category_sums.values):
-            plt.text(i, val + 1, str(int(val)), ha='center')
-        st.pyplot(plt)
-        plt.clf()
-        st.markdown("**Interpretation:** Categorization of AQI helps understand the frequency of clean vs unhealthy air days.")
+@sections.section("AQI Days by Category", depends=("selected_years", "selected_cbsa"))
+def category_days(selected_years, selected_cbsa):
+    categories = queries.CATEGORIES
+    if all(col in available_columns for col in categories):
+        st.subheader("AQI Days by Category")
+        category_sums = queries.aqi_categories(selected_years, selected_cbsa)
+        if not category_sums.empty:
+            def draw_category_sums(fig):
+                ax = fig.subplots()
+                ax.bar(category_sums.index, category_sums.values, color='skyblue')
+                ax.set_title("AQI Days by Category")
+                ax.set_xlabel("Category")
+                ax.set_ylabel("Number of Days")
+                ax.grid(axis="y")
+                for i, val in enumerate(category_sums.values):
+                    ax.text(i, val + 1, str(int(val)), ha='center')
+            charts.show(
+                "page1.category_sums", draw_category_sums,
+                spec=lambda: charts.bar(category_sums, "AQI Days by Category", "Category", "Number of Days"),
+                params={"years": selected_years, "cbsa": selected_cbsa}, datasets=[AQI], figsize=(8, 6)
+            )
+            st.markdown("**Interpretation:** Categorization of AQI helps understand the frequency of clean vs unhealthy air days.")
+        else:
+            st.warning("No category data found.")
     else:
-        st.warning("No category data found.")
-else:
-    st.warning("One or more AQI category columns are missing.")
+        st.warning("One or more AQI category columns are missing.")
+category_days(inputs)
 
 # Section 3: Pollutant Days by Year
-pollutant_columns = ["#_Days_CO", "#_Days_NO2", "#_Days_O3", "#_Days_PM2.5", "#_Days_PM10"]
-if all(col in available_columns for col in pollutant_columns):
-    st.subheader("Pollutant Days by Year")
-    for col in pollutant_columns:
-        filtered_data[col] = pd.to_numeric(filtered_data[col], errors="coerce").fillna(0)
-    yearly_pollutants = filtered_data.groupby("Year")[pollutant_columns].sum()
-    if not yearly_pollutants.empty and yearly_pollutants.sum().sum() > 0:
-        yearly_pollutants.plot(kind="bar", stacked=True, figsize=(10, 6), color=plt.cm.tab10.colors)
-        plt.title("Pollutant Days by Year")
-        plt.xlabel("Year")
-        plt.ylabel("Number of Days")
-        plt.grid(axis="y")
-        st.pyplot(plt)
-        plt.clf()
-        st.markdown("**Interpretation:** Tracks how often each pollutant exceeded safe levels over the years.")
+@sections.section("Pollutant Days by Year", depends=("selected_years", "selected_cbsa"))
+def pollutant_days(selected_years, selected_cbsa):
+    pollutant_columns = queries.POLLUTANTS
+    if all(col in available_columns for col in pollutant_columns):
+        st.subheader("Pollutant Days by Year")
+        yearly_pollutants = queries.yearly_pollutants(selected_years, selected_cbsa, max_bars=downsample.MAX_BARS)
+        if not yearly_pollutants.empty and yearly_pollutants.sum().sum() > 0:
+            def draw_yearly_pollutants(fig):
+                ax = fig.subplots()
+                yearly_pollutants.plot(ax=ax, kind="bar", stacked=True, color=plt.cm.tab10.colors)
+                ax.set_title("Pollutant Days by Year")
+                ax.set_xlabel("Year")
+                ax.set_ylabel("Number of Days")
+                ax.grid(axis="y")
+            charts.show(
+                "page1.yearly_pollutants", draw_yearly_pollutants,
+                spec=lambda: charts.stacked_bar(yearly_pollutants, "Pollutant Days by Year", "Year", "Number of Days", "Pollutant"),
+                params={"years": selected_years, "cbsa": selected_cbsa}, datasets=[AQI]
+            )
+            st.markdown("**Interpretation:** Tracks how often each pollutant exceeded safe levels over the years.")
+        else:
+            st.warning("No pollutant trend data available.")
     else:
-        st.warning("No pollutant trend data available.")
-else:
-    st.warning("Missing pollutant day columns.")
+        st.warning("Missing pollutant day columns.")
+pollutant_days(inputs)
 
 # Section 4: AQI Statistics
-if all(col in available_columns for col in ["AQI_Maximum", "AQI_90th_Percentile", "AQI_Median"]):
-    st.subheader("AQI Statistics Over Time")
-    aqi_stats = filtered_data.groupby("Year")[["AQI_Maximum", "AQI_90th_Percentile", "AQI_Median"]].mean()
-    aqi_stats.plot(figsize=(10, 6), marker='o')
-    plt.title("AQI Statistics")
-    plt.xlabel("Year")
-    plt.ylabel("AQI Value")
-    plt.legend(title="Statistic")
-    plt.grid(True)
-    st.pyplot(plt)
-    plt.clf()
-    st.markdown("**Interpretation:** Maximum and percentile AQI values reveal peaks and consistent exposure levels.")
-else:
-    st.warning("Missing AQI statistics columns.")
+@sections.section("AQI Statistics", depends=("selected_years", "selected_cbsa"))
+def aqi_statistics(selected_years, selected_cbsa):
+    if all(col in available_columns for col in queries.AQI_STATISTICS):
+        st.subheader("AQI Statistics Over Time")
+        aqi_stats = queries.aqi_stats(selected_years, selected_cbsa, max_points=downsample.MAX_POINTS)
+        def draw_aqi_stats(fig):
+            ax = fig.subplots()
+            aqi_stats.plot(ax=ax, marker='o')
+            ax.set_title("AQI Statistics")
+            ax.set_xlabel("Year")
+            ax.set_ylabel("AQI Value")
+            ax.legend(title="Statistic")
+            ax.grid(True)
+        charts.show(
+            "page1.aqi_stats", draw_aqi_stats,
+            spec=lambda: charts.line(aqi_stats, "AQI Statistics", "Year", "AQI Value", "Statistic"),
+            params={"years": selected_years, "cbsa": selected_cbsa}, datasets=[AQI]
+        )
+        st.markdown("**Interpretation:** Maximum and percentile AQI values reveal peaks and consistent exposure levels.")
+    else:
+        st.warning("Missing AQI statistics columns.")
+aqi_statistics(inputs)
+
+# Section 5: AQI Trends by CBSA
+@sections.section("AQI Median Trends by CBSA", lazy=True)
+def trends_by_cbsa():
+    cbsa_trends = queries.aqi_trends()
+    st.dataframe(
+        cbsa_trends.sort_values("slope")[["slope", "sens_slope", "r2", "stderr", "n_years"]].rename(columns={
+            "slope": "Trend (AQI/year)", "sens_slope": "Sen's Slope (AQI/year)", "r2": "R²", "stderr": "Std. Error", "n_years": "Years",
+        }).rename_axis("CBSA"),
+    )
+    st.markdown("**Interpretation:** Linear trends of the yearly median AQI for every CBSA. Negative slopes indicate improving air quality.")
+trends_by_cbsa(inputs)
+
+# Section 6: Summary Table
+@sections.section("Filtered Dataset Summary", depends=("selected_years", "selected_cbsa"), lazy=True)
+def summary_table(selected_years, selected_cbsa):
+    tables.show("page1.summary", AQI, queries.aqi_filters(selected_years, selected_cbsa), file_name="aqi_filtered")
+    st.markdown("**Interpretation:** The table displays detailed metrics for the selected CBSA and year range.")
+summary_table(inputs)
 
-# Section 5: Summary Table
-st.subheader("Filtered Dataset Summary")
-st.dataframe(filtered_data)
-st.markdown("**Interpretation:** The table displays detailed metrics for the selected CBSA and year range.")
+metrics.panel()
@@ -1,24 +1,24 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import os
+from dashboard import charts, downsample, metrics, monthly, precompute, queries, sections, trends
+from dashboard.data import SNOW_DEPTH, GROUND_WATER, columns, load_ground_water
 
-# Set current directory for compatibility with unified dashboard
-current_dir = os.path.dirname(__file__)
-snow_depth_path = os.path.abspath(os.path.join(current_dir, "..", "data", "reshaped_snow_depth.csv"))
-ground_water_path = os.path.abspath(os.path.join(current_dir, "..", "data", "fixed_ground_water_cleaned.csv"))
+metrics.begin("page2")
+precompute.indicator()
 
-# Load the datasets
+# Load the datasets (parsed once per process and shared across sessions)
 try:
-    snow_depth_data = pd.read_csv(snow_depth_path)
-    ground_water_data = pd.read_csv(ground_water_path)
+    with metrics.section("load"):
+        snow_grid = monthly.get()
+        ground_water_data = load_ground_water(["Water Year", "Static Water Level (ft)"])
+        snow_trends = trends.get(SNOW_DEPTH, "Snow Depth (in)")
+        water_level_trends = trends.get(GROUND_WATER, "Static Water Level (ft)")
 except FileNotFoundError:
     st.error("Dataset not found. Please ensure the files exist in the 'data/' directory.")
     st.stop()
 
 # Ensure required columns exist
-snow_columns = snow_depth_data.columns
+snow_columns = columns(SNOW_DEPTH)
 ground_columns = ground_water_data.columns
 
 # Sidebar options
@@ -26,7 +26,7 @@ st.sidebar.header("Dashboard Options")
 
 # Year range selection for snow depth data
 if "Water Year" in snow_columns:
-    years = sorted(snow_depth_data["Water Year"].unique())
+    years = snow_grid.years
     selected_years = st.sidebar.slider(
         "Select Year Range",
         int(min(years)),
@@ -39,128 +39,236 @@ else:
 
 # Site selection for snow depth analysis
 if "Site" in snow_columns:
-    selected_site = st.sidebar.selectbox("Select Site", snow_depth_data["Site"].unique())
+    selected_site = st.sidebar.selectbox("Select Site", snow_grid.sites)
 else:
     st.warning("The 'Site' column is missing in the dataset.")
     selected_site = None
 
-# Filter snow depth data based on selections
-filtered_snow_data = snow_depth_data[(snow_depth_data["Water Year"] >= selected_years[0]) & (snow_depth_data["Water Year"] <= selected_years[1])]
-if selected_site:
-    filtered_snow_data = filtered_snow_data[filtered_snow_data["Site"] == selected_site]
+# Sidebar inputs the sections below depend on
+inputs = {"selected_years": selected_years, "selected_site": selected_site}
 
 # Display header
 st.title("\U0001F30A Water Resource Dashboard")
 
 # 1. Yearly Snow Depth Trends
-st.subheader("Yearly Snow Depth Trends")
-if not filtered_snow_data.empty:
-    yearly_trends = filtered_snow_data.groupby("Water Year")["Snow Depth (in)"].mean()
-    plt.figure(figsize=(10, 6))
-    plt.scatter(yearly_trends.index, yearly_trends, color='blue', alpha=0.7, edgecolor='k')
-    m, b = np.polyfit(yearly_trends.index, yearly_trends, 1)
-    plt.plot(yearly_trends.index, m * yearly_trends.index + b, color='red')
-    plt.title(f"Yearly Snow Depth Trends for {selected_site}")
-    plt.xlabel("Year")
-    plt.ylabel("Average Snow Depth (in)")
-    plt.grid(True)
-    st.pyplot(plt)
-    plt.clf()
-    st.markdown("**Interpretation:** This graph shows the average snow depth over the years for the selected site, along with a trend line.")
-else:
-    st.warning("No data available for the selected site and year range.")
+@sections.section("Yearly Snow Depth Trends", depends=("selected_years", "selected_site"))
+def snow_depth_trends(selected_years, selected_site):
+    st.subheader("Yearly Snow Depth Trends")
+    yearly_trends = queries.snow_depth(selected_site, selected_years, max_points=downsample.MAX_POINTS)
+    if not yearly_trends.empty:
+        def draw_yearly_trends(fig):
+            ax = fig.subplots()
+            ax.scatter(yearly_trends.index, yearly_trends, color='blue', alpha=0.7, edgecolor='k')
+            fit = snow_trends.fit(selected_site, selected_years)
+            m, b = fit["slope"], fit["intercept"]
+            ax.plot(yearly_trends.index, m * yearly_trends.index + b, color='red')
+            ax.set_title(f"Yearly Snow Depth Trends for {selected_site}")
+            ax.set_xlabel("Year")
+            ax.set_ylabel("Average Snow Depth (in)")
+            ax.grid(True)
+        charts.show(
+            "page2.yearly_trends", draw_yearly_trends,
+            spec=lambda: charts.scatter(
+                yearly_trends.reset_index(), "Water Year", "Snow Depth (in)", f"Yearly Snow Depth Trends for {selected_site}",
+                "Year", "Average Snow Depth (in)", color="blue", year_axis=True
+            ),
+            params={"years": selected_years, "site": selected_site}, datasets=[SNOW_DEPTH])
+        st.markdown("**Interpretation:** This graph shows the average snow depth over the years for the selected site, along with a trend line.")
+    else:
+        st.warning("No data available for the selected site and year range.")
+
+    nearby_systems = queries.systems_near(selected_site)
+    if nearby_systems is not None and not nearby_systems.empty:
+        st.markdown(f"**Groundwater systems within 25 km of {selected_site}:**")
+        st.dataframe(nearby_systems, hide_index=True)
+snow_depth_trends(inputs)
+
+# Monthly breakdown of the snow season
+@sections.section("Monthly Snow Depth Profile", depends=("selected_years", "selected_site"))
+def monthly_profile(selected_years, selected_site):
+    st.subheader("Monthly Snow Depth Profile")
+    profile = queries.snow_monthly(selected_site, selected_years)
+    if not profile.empty:
+        def draw_profile(fig):
+            ax = fig.subplots()
+            labels = profile.index.astype(str)
+            ax.bar(labels, profile["Mean"], color="lightsteelblue", edgecolor="k")
+            ax.errorbar(
+                labels, profile["Mean"],
+                yerr=[profile["Mean"] - profile["Lowest"], profile["Highest"] - profile["Mean"]],
+                fmt="none", ecolor="gray", capsize=4
+            )
+            ax.set_title(f"Monthly Snow Depth for {selected_site}")
+            ax.set_xlabel("Month")
+            ax.set_ylabel("Snow Depth (in)")
+            ax.grid(True, axis="y")
+        charts.show(
+            "page2.monthly_profile", draw_profile,
+            spec=lambda: charts.bar(
+                profile["Mean"].rename_axis("Month").rename(index=str), f"Monthly Snow Depth for {selected_site}",
+                "Month", "Average Snow Depth (in)", color="lightsteelblue"
+            ),
+            params={"years": selected_years, "site": selected_site}, datasets=[SNOW_DEPTH])
+        st.markdown("**Interpretation:** Average snow depth in each month of the season over the selected years; the whiskers span the lowest and highest yearly values.")
+    else:
+        st.warning("No monthly data available for the selected site and year range.")
+monthly_profile(inputs)
+
+# Snow depth readings at the finest resolution the chart can show
+@sections.section("Snow Depth History", depends=("selected_years", "selected_site"), lazy=True)
+def snow_history(selected_years, selected_site):
+    history = queries.snow_history(selected_site, selected_years, max_points=downsample.MAX_POINTS)
+    if not history.empty:
+        resolution = "monthly readings" if history.index.name == "Month" else "yearly averages"
+        def draw_history(fig):
+            ax = fig.subplots()
+            ax.plot(history.index, history.values, marker='.', linewidth=0.8, color='steelblue')
+            ax.set_title(f"Snow Depth History for {selected_site} ({resolution})")
+            ax.set_xlabel("Date" if history.index.name == "Month" else "Year")
+            ax.set_ylabel("Snow Depth (in)")
+            ax.grid(True)
+        charts.show(
+            "page2.snow_history", draw_history,
+            spec=lambda: charts.line(
+                history, f"Snow Depth History for {selected_site} ({resolution})",
+                "Date" if history.index.name == "Month" else "Year", "Snow Depth (in)",
+                temporal=history.index.name == "Month"
+            ),
+            params={"years": selected_years, "site": selected_site}, datasets=[SNOW_DEPTH])
+        st.markdown(f"**Interpretation:** Snow depth at {selected_site} shown as {resolution}; long year ranges switch to yearly averages so the chart stays readable.")
+    else:
+        st.warning("No snow depth readings available for the selected site and year range.")
+snow_history(inputs)
 
 # 2. Static Water Level Trends
-st.subheader("Static Water Level Trends")
-if "Water Year" in ground_columns:
-    filtered_ground_data = ground_water_data[(ground_water_data["Water Year"] >= selected_years[0]) & (ground_water_data["Water Year"] <= selected_years[1])]
-    avg_water_level = filtered_ground_data.groupby("Water Year")["Static Water Level (ft)"].mean()
-    if not avg_water_level.empty:
-        plt.figure(figsize=(10, 6))
-        plt.scatter(avg_water_level.index, avg_water_level, color='green', alpha=0.7, edgecolor='k')
-        m, b = np.polyfit(avg_water_level.index, avg_water_level, 1)
-        plt.plot(avg_water_level.index, m * avg_water_level.index + b, color='red')
-        plt.title("Static Water Level Trends")
-        plt.xlabel("Year")
-        plt.ylabel("Average Static Water Level (ft)")
-        plt.grid(True)
-        st.pyplot(plt)
-        plt.clf()
-        st.markdown("**Interpretation:** This graph shows the average static water level over the years with a trend line.")
+@sections.section("Static Water Level Trends", depends=("selected_years",))
+def static_water_level(selected_years):
+    st.subheader("Static Water Level Trends")
+    if "Water Year" in ground_columns:
+        avg_water_level = queries.water_level(selected_years, max_points=downsample.MAX_POINTS)
+        if not avg_water_level.empty:
+            def draw_avg_water_level(fig):
+                ax = fig.subplots()
+                ax.scatter(avg_water_level.index, avg_water_level, color='green', alpha=0.7, edgecolor='k')
+                fit = water_level_trends.fit(years=selected_years)
+                m, b = fit["slope"], fit["intercept"]
+                ax.plot(avg_water_level.index, m * avg_water_level.index + b, color='red')
+                ax.set_title("Static Water Level Trends")
+                ax.set_xlabel("Year")
+                ax.set_ylabel("Average Static Water Level (ft)")
+                ax.grid(True)
+            charts.show(
+                "page2.avg_water_level", draw_avg_water_level,
+                spec=lambda: charts.scatter(
+                    avg_water_level.reset_index(), "Water Year", "Static Water Level (ft)", "Static Water Level Trends",
+                    "Year", "Average Static Water Level (ft)", color="green", year_axis=True
+                ),
+                params={"years": selected_years}, datasets=[GROUND_WATER])
+            st.markdown("**Interpretation:** This graph shows the average static water level over the years with a trend line.")
+        else:
+            st.warning("No valid data available for Static Water Level Trends.")
     else:
-        st.warning("No valid data available for Static Water Level Trends.")
-else:
-    st.error("The 'Water Year' column is missing in the ground water dataset.")
-    st.stop()
+        st.error("The 'Water Year' column is missing in the ground water dataset.")
+        st.stop()
+static_water_level(inputs)
 
 # 3. Snow Depth vs Static Water Level Correlation
-st.subheader("Snow Depth vs Static Water Level Correlation")
-combined_data = filtered_snow_data.groupby("Water Year")["Snow Depth (in)"].mean().reset_index()
-if "Water Year" in ground_columns:
-    combined_data = combined_data.merge(
-        filtered_ground_data.groupby("Water Year")["Static Water Level (ft)"].mean().reset_index(),
-        on="Water Year",
-        how="inner"
-    )
-    if not combined_data.empty:
-        plt.figure(figsize=(10, 6))
-        plt.scatter(
-            combined_data["Snow Depth (in)"],
-            combined_data["Static Water Level (ft)"],
-            alpha=0.7, edgecolor='k'
-        )
-        m, b = np.polyfit(combined_data["Snow Depth (in)"], combined_data["Static Water Level (ft)"], 1)
-        plt.plot(combined_data["Snow Depth (in)"], m * combined_data["Snow Depth (in)"] + b, color='red')
-        plt.title("Correlation Between Snow Depth and Static Water Level")
-        plt.xlabel("Average Snow Depth (in)")
-        plt.ylabel("Average Static Water Level (ft)")
-        plt.grid(True)
-        st.pyplot(plt)
-        plt.clf()
-        st.markdown("**Interpretation:** This scatter plot shows the correlation between snow depth and static water level.")
+@sections.section("Snow Depth vs Static Water Level Correlation", depends=("selected_years", "selected_site"))
+def snow_vs_water(selected_years, selected_site):
+    st.subheader("Snow Depth vs Static Water Level Correlation")
+    if "Water Year" in ground_columns:
+        combined_data = queries.snow_vs_water(selected_site, selected_years)
+        if not combined_data.empty:
+            def draw_combined_data(fig):
+                ax = fig.subplots()
+                ax.scatter(
+                    combined_data["Snow Depth (in)"],
+                    combined_data["Static Water Level (ft)"],
+                    alpha=0.7, edgecolor='k'
+                )
+                m, b = np.polyfit(combined_data["Snow Depth (in)"], combined_data["Static Water Level (ft)"], 1)
+                ax.plot(combined_data["Snow Depth (in)"], m * combined_data["Snow Depth (in)"] + b, color='red')
+                ax.set_title("Correlation Between Snow Depth and Static Water Level")
+                ax.set_xlabel("Average Snow Depth (in)")
+                ax.set_ylabel("Average Static Water Level (ft)")
+                ax.grid(True)
+            charts.show(
+                "page2.combined_data", draw_combined_data,
+                spec=lambda: charts.scatter(
+                    combined_data, "Snow Depth (in)", "Static Water Level (ft)", "Correlation Between Snow Depth and Static Water Level",
+                    "Average Snow Depth (in)", "Average Static Water Level (ft)"
+                ),
+                params={"years": selected_years, "site": selected_site}, datasets=[SNOW_DEPTH, GROUND_WATER])
+            st.markdown("**Interpretation:** This scatter plot shows the correlation between snow depth and static water level.")
+        else:
+            st.warning("No valid data available for correlation analysis.")
     else:
-        st.warning("No valid data available for correlation analysis.")
-else:
-    st.warning("Data for correlation is not available.")
+        st.warning("Data for correlation is not available.")
+snow_vs_water(inputs)
 
 # 4. Top Sites with Greatest Resource Decline
-st.subheader("Top Sites with Greatest Resource Decline")
-snow_decline = snow_depth_data.groupby("Site")["Snow Depth (in)"].agg(["first", "last"])
-snow_decline["Decline"] = snow_decline["first"] - snow_decline["last"]
-top_decline_sites = snow_decline.nlargest(10, "Decline")["Decline"].reset_index()
-plt.figure(figsize=(10, 6))
-plt.barh(top_decline_sites["Site"], top_decline_sites["Decline"], color="skyblue")
-plt.title("Top Sites with Greatest Snow Depth Decline")
-plt.xlabel("Decline in Snow Depth (in)")
-plt.ylabel("Site")
-plt.grid(True, axis="x")
-st.pyplot(plt)
-plt.clf()
-st.markdown("**Interpretation:** This chart highlights sites with the greatest snow depth decline over time.")
+@sections.section("Top Sites with Greatest Resource Decline", lazy=True)
+def top_decline():
+    top_decline_sites = queries.snow_decline()
+    def draw_top_decline_sites(fig):
+        ax = fig.subplots()
+        ax.barh(top_decline_sites["Site"], top_decline_sites["Decline"], color="skyblue")
+        ax.set_title("Top Sites with Greatest Snow Depth Decline")
+        ax.set_xlabel("Decline in Snow Depth (in/year, linear trend)")
+        ax.set_ylabel("Site")
+        ax.grid(True, axis="x")
+    charts.show(
+        "page2.top_decline_sites", draw_top_decline_sites,
+        spec=lambda: charts.bar(
+            top_decline_sites.set_index("Site")["Decline"], "Top Sites with Greatest Snow Depth Decline",
+            "Decline in Snow Depth (in/year, linear trend)", "Site", horizontal=True
+        ),
+        datasets=[SNOW_DEPTH]
+    )
+    st.dataframe(
+        top_decline_sites[["Site", "slope", "sens_slope", "r2", "stderr", "n_years"]].rename(columns={
+            "slope": "Trend (in/year)", "sens_slope": "Sen's Slope (in/year)", "r2": "R²", "stderr": "Std. Error", "n_years": "Years",
+        }),
+        hide_index=True,
+    )
+    st.markdown("**Interpretation:** This chart highlights sites with the greatest snow depth decline over time, ranked by the slope of each site's yearly average snow depth trend.")
+top_decline(inputs)
 
 # 5. Overall Trends Across All Sites and Years
-st.subheader("Overall Trends Across All Sites and Years")
-overall_snow_depth = snow_depth_data.groupby("Water Year")["Snow Depth (in)"].mean().reset_index()
-overall_water_level = ground_water_data.groupby("Water Year")["Static Water Level (ft)"].mean().reset_index()
-combined_overall = overall_snow_depth.merge(overall_water_level, on="Water Year", how="inner")
-
-if not combined_overall.empty:
-    plt.figure(figsize=(10, 6))
-    plt.plot(combined_overall["Water Year"], combined_overall["Snow Depth (in)"], marker='o', color='blue', label='Avg Snow Depth')
-    plt.plot(combined_overall["Water Year"], combined_overall["Static Water Level (ft)"], marker='o', color='green', label='Avg Static Water Level')
-    m_snow, b_snow = np.polyfit(combined_overall["Water Year"], combined_overall["Snow Depth (in)"], 1)
-    plt.plot(combined_overall["Water Year"], m_snow * combined_overall["Water Year"] + b_snow, color='blue', linestyle='--')
-    m_water, b_water = np.polyfit(combined_overall["Water Year"], combined_overall["Static Water Level (ft)"], 1)
-    plt.plot(combined_overall["Water Year"], m_water * combined_overall["Water Year"] + b_water, color='green', linestyle='--')
-    plt.title("Overall Trends Across All Sites and Years")
-    plt.xlabel("Year")
-    plt.ylabel("Values")
-    plt.legend()
-    plt.grid(True)
-    st.pyplot(plt)
-    plt.clf()
-    st.markdown("**Interpretation:** This graph provides a combined view of trends in snow and water levels across all years.")
-else:
-    st.warning("No valid data available for overall trends.")
+@sections.section("Overall Trends Across All Sites and Years", lazy=True)
+def overall_trends():
+    combined_overall = queries.overall_water()
+
+    if not combined_overall.empty:
+        def draw_combined_overall(fig):
+            ax = fig.subplots()
+            ax.plot(combined_overall["Water Year"], combined_overall["Snow Depth (in)"], marker='o', color='blue', label='Avg Snow Depth')
+            ax.plot(combined_overall["Water Year"], combined_overall["Static Water Level (ft)"], marker='o', color='green', label='Avg Static Water Level')
+            # Fit over the years both series have, i.e. the plotted points.
+            m_snow, b_snow = np.polyfit(combined_overall["Water Year"], combined_overall["Snow Depth (in)"], 1)
+            ax.plot(combined_overall["Water Year"], m_snow * combined_overall["Water Year"] + b_snow, color='blue', linestyle='--')
+            m_water, b_water = np.polyfit(combined_overall["Water Year"], combined_overall["Static Water Level (ft)"], 1)
+            ax.plot(combined_overall["Water Year"], m_water * combined_overall["Water Year"] + b_water, color='green', linestyle='--')
+            ax.set_title("Overall Trends Across All Sites and Years")
+            ax.set_xlabel("Year")
+            ax.set_ylabel("Values")
+            ax.legend()
+            ax.grid(True)
+        charts.show(
+            "page2.combined_overall", draw_combined_overall,
+            spec=lambda: charts.line(
+                combined_overall.set_index("Water Year").rename(columns={
+                    "Snow Depth (in)": "Avg Snow Depth", "Static Water Level (ft)": "Avg Static Water Level",
+                }),
+                "Overall Trends Across All Sites and Years", "Year", "Values", trend=True
+            ),
+            datasets=[SNOW_DEPTH, GROUND_WATER]
+        )
+        st.markdown("**Interpretation:** This graph provides a combined view of trends in snow and water levels across all years.")
+    else:
+        st.warning("No valid data available for overall trends.")
+overall_trends(inputs)
 
 st.markdown("Return to homepage using the navigation menu.")
+
+metrics.panel()
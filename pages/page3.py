@@ -1,95 +1,173 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import os
+from dashboard import charts, metrics, precompute, queries, sections, tables
+from dashboard.data import SNOW_DEPTH, GROUND_WATER, AQI
 
-# Resolve paths relative to current file location
-current_dir = os.path.dirname(__file__)
-snow_depth_path = os.path.abspath(os.path.join(current_dir, "..", "data", "reshaped_snow_depth.csv"))
-ground_water_path = os.path.abspath(os.path.join(current_dir, "..", "data", "fixed_ground_water_cleaned.csv"))
-aqi_path = os.path.abspath(os.path.join(current_dir, "..", "data", "aqi_combined_1980_2024.csv"))
+DATASETS = [SNOW_DEPTH, GROUND_WATER, AQI]
 
-# Load datasets
+metrics.begin("page3")
+precompute.indicator()
+
+# Yearly averages from the precomputed aggregate cubes
 try:
-    snow_depth_data = pd.read_csv(snow_depth_path)
-    ground_water_data = pd.read_csv(ground_water_path)
-    aqi_data = pd.read_csv(aqi_path)
+    with metrics.section("load"):
+        correlation_data = queries.correlation_data()
 except FileNotFoundError:
     st.error("One or more datasets not found. Please ensure the files are in the 'data/' directory.")
     st.stop()
 
-# Merge datasets
-snow_avg = snow_depth_data.groupby("Water Year")["Snow Depth (in)"].mean().reset_index()
-water_avg = ground_water_data.groupby("Water Year")["Static Water Level (ft)"].mean().reset_index()
-aqi_avg = aqi_data.groupby("Year")["AQI_Median"].mean().reset_index()
-aqi_avg.rename(columns={"Year": "Water Year"}, inplace=True)
-
-correlation_data = snow_avg.merge(water_avg, on="Water Year", how="inner")
-correlation_data = correlation_data.merge(aqi_avg, on="Water Year", how="inner")
-
 # Title
 st.title("Correlation Dashboard: Snow, Water & Air Quality")
 
 # Combined Dataset Table
-st.subheader("Combined Dataset Overview")
-st.dataframe(correlation_data)
-st.markdown("**Interpretation:** This table integrates snow depth, groundwater level, and air quality index over the years to observe trends and interdependencies.")
+@sections.section("Combined Dataset Overview")
+def combined_overview():
+    st.subheader("Combined Dataset Overview")
+    tables.show("page3.overview", correlation_data, file_name="combined_overview")
+    st.markdown("**Interpretation:** This table integrates snow depth, groundwater level, and air quality index over the years to observe trends and interdependencies.")
+combined_overview()
 
 # Correlation Heatmap
-st.subheader("Correlation Heatmap")
-plt.figure(figsize=(10, 6))
-corr_matrix = correlation_data.drop(columns="Water Year").corr()
-plt.imshow(corr_matrix, cmap="coolwarm", aspect="auto")
-plt.colorbar(label="Correlation Coefficient")
-plt.xticks(range(len(corr_matrix.columns)), corr_matrix.columns, rotation=45, ha="right")
-plt.yticks(range(len(corr_matrix.columns)), corr_matrix.columns)
-plt.title("Correlation Between Variables")
-for i in range(len(corr_matrix.columns)):
-    for j in range(len(corr_matrix.columns)):
-        plt.text(j, i, f"{corr_matrix.iloc[i, j]:.2f}", ha="center", va="center", color="black")
-st.pyplot(plt)
-plt.clf()
-st.markdown("**Interpretation:** This heatmap visualizes how snow depth, static water levels, and AQI values relate to one another through correlation coefficients.")
+@sections.section("Correlation Heatmap")
+def correlation_heatmap():
+    st.subheader("Correlation Heatmap")
+    corr_matrix = queries.corr_matrix()
+    def draw_corr_matrix(fig):
+        ax = fig.subplots()
+        image = ax.imshow(corr_matrix, cmap="coolwarm", aspect="auto")
+        fig.colorbar(image, ax=ax, label="Correlation Coefficient")
+        ax.set_xticks(range(len(corr_matrix.columns)), corr_matrix.columns, rotation=45, ha="right")
+        ax.set_yticks(range(len(corr_matrix.columns)), corr_matrix.columns)
+        ax.set_title("Correlation Between Variables")
+        for i in range(len(corr_matrix.columns)):
+            for j in range(len(corr_matrix.columns)):
+                ax.text(j, i, f"{corr_matrix.iloc[i, j]:.2f}", ha="center", va="center", color="black")
+    charts.show(
+        "page3.corr_matrix", draw_corr_matrix,
+        spec=lambda: charts.heatmap(corr_matrix, "Correlation Between Variables", "Correlation Coefficient"),
+        datasets=DATASETS
+    )
+    st.markdown("**Interpretation:** This heatmap visualizes how snow depth, static water levels, and AQI values relate to one another through correlation coefficients.")
+correlation_heatmap()
 
 # Snow Depth vs Static Water Level
-st.subheader("Snow Depth vs Static Water Level")
-plt.figure(figsize=(10, 6))
-plt.scatter(correlation_data["Snow Depth (in)"], correlation_data["Static Water Level (ft)"], alpha=0.7, edgecolor='k')
-m, b = np.polyfit(correlation_data["Snow Depth (in)"], correlation_data["Static Water Level (ft)"], 1)
-plt.plot(correlation_data["Snow Depth (in)"], m * correlation_data["Snow Depth (in)"] + b, color='red')
-plt.title("Snow Depth vs Static Water Level")
-plt.xlabel("Avg Snow Depth (in)")
-plt.ylabel("Avg Static Water Level (ft)")
-plt.grid(True)
-st.pyplot(plt)
-plt.clf()
+@sections.section("Snow Depth vs Static Water Level")
+def snow_vs_water():
+    st.subheader("Snow Depth vs Static Water Level")
+    def draw_snow_vs_water(fig):
+        ax = fig.subplots()
+        ax.scatter(correlation_data["Snow Depth (in)"], correlation_data["Static Water Level (ft)"], alpha=0.7, edgecolor='k')
+        m, b = np.polyfit(correlation_data["Snow Depth (in)"], correlation_data["Static Water Level (ft)"], 1)
+        ax.plot(correlation_data["Snow Depth (in)"], m * correlation_data["Snow Depth (in)"] + b, color='red')
+        ax.set_title("Snow Depth vs Static Water Level")
+        ax.set_xlabel("Avg Snow Depth (in)")
+        ax.set_ylabel("Avg Static Water Level (ft)")
+        ax.grid(True)
+    charts.show(
+        "page3.snow_vs_water", draw_snow_vs_water,
+        spec=lambda: charts.scatter(
+            correlation_data, "Snow Depth (in)", "Static Water Level (ft)", "Snow Depth vs Static Water Level",
+            "Avg Snow Depth (in)", "Avg Static Water Level (ft)"
+        ),
+        datasets=DATASETS
+    )
+snow_vs_water()
 
 # Snow Depth vs AQI Median
-st.subheader("Snow Depth vs AQI Median")
-plt.figure(figsize=(10, 6))
-plt.scatter(correlation_data["Snow Depth (in)"], correlation_data["AQI_Median"], alpha=0.7, edgecolor='k')
-m, b = np.polyfit(correlation_data["Snow Depth (in)"], correlation_data["AQI_Median"], 1)
-plt.plot(correlation_data["Snow Depth (in)"], m * correlation_data["Snow Depth (in)"] + b, color='red')
-plt.title("Snow Depth vs AQI Median")
-plt.xlabel("Avg Snow Depth (in)")
-plt.ylabel("Avg AQI Median")
-plt.grid(True)
-st.pyplot(plt)
-plt.clf()
+@sections.section("Snow Depth vs AQI Median")
+def snow_vs_aqi():
+    st.subheader("Snow Depth vs AQI Median")
+    def draw_snow_vs_aqi(fig):
+        ax = fig.subplots()
+        ax.scatter(correlation_data["Snow Depth (in)"], correlation_data["AQI_Median"], alpha=0.7, edgecolor='k')
+        m, b = np.polyfit(correlation_data["Snow Depth (in)"], correlation_data["AQI_Median"], 1)
+        ax.plot(correlation_data["Snow Depth (in)"], m * correlation_data["Snow Depth (in)"] + b, color='red')
+        ax.set_title("Snow Depth vs AQI Median")
+        ax.set_xlabel("Avg Snow Depth (in)")
+        ax.set_ylabel("Avg AQI Median")
+        ax.grid(True)
+    charts.show(
+        "page3.snow_vs_aqi", draw_snow_vs_aqi,
+        spec=lambda: charts.scatter(
+            correlation_data, "Snow Depth (in)", "AQI_Median", "Snow Depth vs AQI Median", "Avg Snow Depth (in)", "Avg AQI Median"
+        ),
+        datasets=DATASETS
+    )
+snow_vs_aqi()
 
 # Static Water Level vs AQI Median
-st.subheader("Static Water Level vs AQI Median")
-plt.figure(figsize=(10, 6))
-plt.scatter(correlation_data["Static Water Level (ft)"], correlation_data["AQI_Median"], alpha=0.7, edgecolor='k')
-m, b = np.polyfit(correlation_data["Static Water Level (ft)"], correlation_data["AQI_Median"], 1)
-plt.plot(correlation_data["Static Water Level (ft)"], m * correlation_data["Static Water Level (ft)"] + b, color='red')
-plt.title("Static Water Level vs AQI Median")
-plt.xlabel("Avg Static Water Level (ft)")
-plt.ylabel("Avg AQI Median")
-plt.grid(True)
-st.pyplot(plt)
-plt.clf()
+@sections.section("Static Water Level vs AQI Median")
+def water_vs_aqi():
+    st.subheader("Static Water Level vs AQI Median")
+    def draw_water_vs_aqi(fig):
+        ax = fig.subplots()
+        ax.scatter(correlation_data["Static Water Level (ft)"], correlation_data["AQI_Median"], alpha=0.7, edgecolor='k')
+        m, b = np.polyfit(correlation_data["Static Water Level (ft)"], correlation_data["AQI_Median"], 1)
+        ax.plot(correlation_data["Static Water Level (ft)"], m * correlation_data["Static Water Level (ft)"] + b, color='red')
+        ax.set_title("Static Water Level vs AQI Median")
+        ax.set_xlabel("Avg Static Water Level (ft)")
+        ax.set_ylabel("Avg AQI Median")
+        ax.grid(True)
+    charts.show(
+        "page3.water_vs_aqi", draw_water_vs_aqi,
+        spec=lambda: charts.scatter(
+            correlation_data, "Static Water Level (ft)", "AQI_Median", "Static Water Level vs AQI Median",
+            "Avg Static Water Level (ft)", "Avg AQI Median"
+        ),
+        datasets=DATASETS
+    )
+water_vs_aqi()
+
+# Correlation Confidence Intervals
+@sections.section("Correlation Confidence Intervals", lazy=True)
+def confidence_intervals():
+    confidence = queries.correlation_intervals()
+    st.dataframe(
+        confidence.rename(columns={"r": "Correlation", "low": "95% CI Low", "high": "95% CI High", "n": "Years"}),
+        hide_index=True,
+    )
+    st.markdown("**Interpretation:** Confidence intervals come from resampling years with replacement. Intervals that include zero mean the relationship could be due to chance.")
+confidence_intervals()
+
+# Lagged Snow Depth vs Groundwater Correlation
+@sections.section("Lagged Snow Depth vs Static Water Level Correlation", lazy=True)
+def lagged_correlations():
+    lag_correlations = queries.lag_correlations()
+    def draw_lag_correlations(fig):
+        ax = fig.subplots()
+        lag_correlations.plot(ax=ax, marker='o')
+        ax.axhline(0, color="black", linewidth=0.8)
+        ax.set_title("Snow Depth (Year N) vs Static Water Level (Year N + Lag)")
+        ax.set_xlabel("Lag (years)")
+        ax.set_ylabel("Correlation Coefficient")
+        ax.grid(True)
+    charts.show(
+        "page3.lag_correlations", draw_lag_correlations,
+        spec=lambda: charts.line(
+            lag_correlations, "Snow Depth (Year N) vs Static Water Level (Year N + Lag)", "Lag (years)",
+            "Correlation Coefficient", "Method"
+        ),
+        datasets=DATASETS
+    )
+    st.markdown("**Interpretation:** Snowmelt can take years to recharge aquifers. Peaks at a lag above zero suggest delayed groundwater response to snowpack.")
+
+    st.subheader("Site-Level Lagged Correlations")
+    st.dataframe(queries.site_lags(), hide_index=True)
+    st.markdown("**Interpretation:** For each snow survey site, the lag at which its snow depth correlates most strongly with statewide static water levels.")
+lagged_correlations()
+
+# Nearby Station Pair Correlations
+@sections.section("Nearby Snow Site and Groundwater System Correlations", lazy=True)
+def station_pair_correlations():
+    station_pairs = queries.station_pairs()
+    if station_pairs is None:
+        st.info("Add station coordinates in 'data/station_coordinates.csv' to correlate each snow site with its nearest groundwater system.")
+    elif station_pairs.empty:
+        st.warning("No snow site has a groundwater system with enough overlapping years nearby.")
+    else:
+        st.dataframe(station_pairs, hide_index=True)
+        st.markdown("**Interpretation:** Each snow survey site is paired with its nearest groundwater system. Local pairs show whether snowpack tracks the water level of the aquifer right next to it.")
+station_pair_correlations()
 
 # Summary
 st.subheader("Insights")
@@ -100,3 +178,5 @@ st.markdown("""
 """)
 
 st.markdown("Use the navigation to return to the homepage or explore other insights in Project 21.")
+
+metrics.panel()